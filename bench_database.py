@@ -0,0 +1,201 @@
+"""Микробенчмарки функций database.py на синтетических базах разного размера.
+
+Для каждого масштаба создаётся отдельная база во временном каталоге и
+замеряются get_products_by_category, get_product, search_products,
+get_cart_items, create_order, get_order_items и delete_category. Кэши каталога и корзин
+очищаются перед каждым замером, чтобы время отражало работу с SQLite.
+
+    python bench_database.py --scales 1k,100k --output bench.json
+    python bench_database.py --scales 1m --iterations 50
+
+Масштаб задаётся как name=products:order_items, например 50k=50000:200000;
+готовые: 1k, 100k, 1m.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARKBENCHMARKBENCHMARKBENCHMAR")
+os.environ.setdefault("ADMIN_ID", "1")
+
+import database  # noqa: E402
+from db_pool import ConnectionPool, WriteCoalescer  # noqa: E402
+
+PRESETS = {
+    "1k": (1_000, 10_000),
+    "100k": (100_000, 1_000_000),
+    "1m": (1_000_000, 1_000_000),
+}
+PRODUCTS_PER_CATEGORY = 500
+ITEMS_PER_ORDER = 3
+USERS = 10_000
+
+
+def parse_scale(value):
+    if value in PRESETS:
+        return value, PRESETS[value]
+    name, _, sizes = value.partition("=")
+    products, _, order_items = sizes.partition(":")
+    return name, (int(products), int(order_items))
+
+
+async def generate(products, order_items):
+    categories = max(1, products // PRODUCTS_PER_CATEGORY)
+    orders = max(1, -(-order_items // ITEMS_PER_ORDER))
+    async with database.pool.write() as db:
+        await db.execute('BEGIN')
+        await db.execute('''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+            INSERT INTO categories (id, name, section)
+            SELECT n, 'Категория ' || n, CASE n % 2 WHEN 0 THEN 'free' ELSE 'paid' END FROM seq
+        ''', (categories,))
+        await db.execute('''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+            INSERT INTO products (id, category_id, name, description, price, photo, asset_url, is_free)
+            SELECT n, (n - 1) % ? + 1, 'Ассет ' || n, 'Синтетическое описание ассета ' || n, 10.0,
+                   'photo-' || n, 'file-' || n, 0
+            FROM seq
+        ''', (products, categories))
+        await db.execute('''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+            INSERT INTO users (user_id, balance) SELECT n, 0.0 FROM seq
+        ''', (USERS,))
+        await db.execute('''
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+            INSERT INTO orders (id, user_id, status, payment_method, total_price, created_at, delivered)
+            SELECT n, (n - 1) % ? + 1, 'delivered', 'bench', 30.0, '2024-01-01T00:00:00', ? FROM seq
+        ''', (orders, USERS, ITEMS_PER_ORDER))
+        await db.execute('''
+            WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < ? - 1)
+            INSERT INTO order_items (order_id, product_id, quantity, price_at_purchase)
+            SELECT n / ? + 1, n % ? + 1, 1, 10.0 FROM seq
+        ''', (order_items, ITEMS_PER_ORDER, products))
+        await db.commit()
+    await database.pool.close()
+    await database.pool.open()
+    return categories, orders
+
+
+async def measure(func, iterations, setup=None):
+    timings = []
+    for i in range(iterations):
+        args = await setup(i) if setup else ()
+        database.catalog.clear()
+        database.carts.clear()
+        start = time.perf_counter()
+        await func(*args)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "min_ms": timings[0] * 1000,
+        "p50_ms": timings[len(timings) // 2] * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+    }
+
+
+async def bench_scale(directory, name, products, order_items, iterations):
+    database.pool = ConnectionPool(os.path.join(directory, f"{name}.db"))
+    database.coalescer = WriteCoalescer(database.pool, database.coalescer.max_batch, database.coalescer.max_delay)
+    database.catalog.clear()
+    database.carts.clear()
+    try:
+        return await _bench_scale(name, products, order_items, iterations)
+    finally:
+        await database.close_db()
+
+
+async def _bench_scale(name, products, order_items, iterations):
+    await database.init_db()
+    start = time.perf_counter()
+    categories, orders = await generate(products, order_items)
+    print(f"[{name}] generated {products} products, {order_items} order items "
+          f"in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    mutating = max(1, iterations // 5)
+    results = {}
+    results["get_products_by_category"] = await measure(
+        database.get_products_by_category, iterations, lambda i: _args(i % categories + 1))
+    results["get_product"] = await measure(
+        database.get_product, iterations, lambda i: _args((i * 7919) % products + 1))
+    results["search_products"] = await measure(
+        database.search_products, iterations, lambda i: _args(f"ассет {(i * 7919) % products + 1}", 10))
+    results["get_order_items"] = await measure(
+        database.get_order_items, iterations, lambda i: _args((i * 7919) % orders + 1))
+
+    async def fill_cart(i):
+        user_id = i % USERS + 1
+        for product_id in range(i * ITEMS_PER_ORDER + 1, i * ITEMS_PER_ORDER + ITEMS_PER_ORDER + 1):
+            await database.add_to_cart(user_id, (product_id - 1) % products + 1)
+        await database.update_user_balance(user_id, 10.0 * ITEMS_PER_ORDER)
+        return (user_id,)
+
+    results["get_cart_items"] = await measure(database.get_cart_items, iterations, fill_cart)
+    results["create_order"] = await measure(
+        lambda user_id: database.create_order(user_id, {'payment_method': 'bench'}), mutating, fill_cart)
+
+    async def new_category(i):
+        async with database.pool.write() as db:
+            async with db.execute("INSERT INTO categories (name, section) VALUES ('bench', 'paid')") as cursor:
+                category_id = cursor.lastrowid
+            await db.executemany(
+                "INSERT INTO products (category_id, name, price, photo, asset_url) VALUES (?, 'x', 1.0, 'p', 'f')",
+                [(category_id,)] * PRODUCTS_PER_CATEGORY
+            )
+            await db.commit()
+        return (category_id,)
+
+    results["delete_category"] = await measure(database.delete_category, mutating, new_category)
+    return {"products": products, "order_items": order_items, "categories": categories, "orders": orders,
+            "functions": results}
+
+
+async def _args(*values):
+    return values
+
+
+async def run(args):
+    directory = args.directory or tempfile.mkdtemp(prefix="assetflow-dbbench-")
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+        },
+        "scales": {},
+    }
+    for value in args.scales.split(","):
+        name, (products, order_items) = parse_scale(value.strip())
+        report["scales"][name] = await bench_scale(directory, name, products, order_items, args.iterations)
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1k,100k")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--directory", help="каталог для сгенерированных баз (по умолчанию временный)")
+    parser.add_argument("--output", help="файл для JSON-отчёта (по умолчанию stdout)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
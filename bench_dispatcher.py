@@ -0,0 +1,266 @@
+"""Нагрузочный прогон Dispatcher'а из main.py на синтетических апдейтах.
+
+Исходящие вызовы Bot API перехватываются фейковой сессией и никуда не
+отправляются, база создаётся во временном файле. Каждый виртуальный
+пользователь проходит сценарии по очереди, пользователи работают параллельно.
+
+    python bench_dispatcher.py --users 200 --concurrency 50 --rounds 3
+    python bench_dispatcher.py --json report.json --max-p95-ms 50
+
+С --max-p95-ms скрипт завершается с кодом 1, если p95 какого-либо сценария
+выше порога, поэтому его можно запускать перед деплоем. Так же работает
+--max-startup-ms: порог времени холодного импорта main и регистрации роутеров.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from itertools import count
+
+ADMIN_ID = 1
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARKBENCHMARKBENCHMARKBENCHMAR")
+os.environ.setdefault("ADMIN_ID", str(ADMIN_ID))
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="assetflow-bench-"), "bench.db"))
+
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import SendMediaGroup  # noqa: E402
+from aiogram.types import Chat, Message, Update  # noqa: E402
+
+import database  # noqa: E402
+import main  # noqa: E402
+from callbacks import MenuCallback, SectionCallback, CategoryCallback, CarouselCallback, AssetCallback, \
+    CartCallback, CheckoutCallback, BalanceCallback  # noqa: E402
+
+
+class FakeSession(BaseSession):
+    """Сессия бота, которая только считает вызовы и возвращает правдоподобные ответы."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = defaultdict(int)
+        self._message_ids = count(1_000_000)
+
+    def _message(self, chat_id):
+        return Message(message_id=next(self._message_ids), date=datetime.now(),
+                       chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"))
+
+    async def make_request(self, bot, method, timeout=None):
+        name = type(method).__name__
+        self.calls[name] += 1
+        chat_id = getattr(method, "chat_id", None)
+        if isinstance(method, SendMediaGroup):
+            return [self._message(chat_id) for _ in method.media]
+        if name.startswith(("Send", "Edit", "Forward")) and chat_id is not None:
+            return self._message(chat_id)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class UpdateFactory:
+    def __init__(self):
+        self._ids = count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def _chat(self, user_id):
+        return {"id": user_id, "type": "private"}
+
+    def message(self, user_id, text):
+        update_id = next(self._ids)
+        return Update.model_validate({"update_id": update_id, "message": {
+            "message_id": update_id, "date": int(time.time()), "chat": self._chat(user_id),
+            "from": self._user(user_id), "text": text,
+        }})
+
+    def callback(self, user_id, data):
+        update_id = next(self._ids)
+        return Update.model_validate({"update_id": update_id, "callback_query": {
+            "id": str(update_id), "from": self._user(user_id), "chat_instance": str(user_id), "data": data,
+            "message": {"message_id": update_id, "date": int(time.time()), "chat": self._chat(user_id),
+                        "from": {"id": 0, "is_bot": True, "first_name": "bot"}, "text": "menu"},
+        }})
+
+
+async def seed(categories, products_per_category):
+    await database.init_db()
+    async with database.pool.write() as db:
+        await db.executemany('INSERT INTO categories (name, section) VALUES (?, ?)', [
+            (f"Категория {i}", "paid" if i % 2 else "free") for i in range(categories)
+        ])
+        async with db.execute('SELECT id, section FROM categories') as cursor:
+            rows = await cursor.fetchall()
+        await db.executemany('''
+            INSERT INTO products (category_id, name, description, price, photo, asset_url, is_free)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (category_id, f"Ассет {category_id}-{n}", "Синтетическое описание", 10.0 if section == "paid" else 0.0,
+             f"photo-{category_id}-{n}", f"file-{category_id}-{n}", 0 if section == "paid" else 1)
+            for category_id, section in rows for n in range(products_per_category)
+        ])
+        await db.commit()
+    return [category_id for category_id, section in rows if section == "paid"]
+
+
+class Runner:
+    def __init__(self, bot, dp, paid_categories, swipes):
+        self.bot = bot
+        self.dp = dp
+        self.paid_categories = paid_categories
+        self.swipes = swipes
+        self.updates = UpdateFactory()
+        self.latencies = defaultdict(list)
+
+    async def feed(self, flow, update):
+        start = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.latencies[flow].append(time.perf_counter() - start)
+
+    async def run_user(self, user_id):
+        u = self.updates
+        category_id = self.paid_categories[user_id % len(self.paid_categories)]
+        await self.feed("start", u.message(user_id, "/start"))
+
+        product = await database.get_next_product(category_id)
+        for data in (MenuCallback(target="catalog"), SectionCallback(section="paid"),
+                     CategoryCallback(category_id=category_id), AssetCallback(action="open", product_id=product[0])):
+            await self.feed("browse", u.callback(user_id, data.pack()))
+        for _ in range(self.swipes):
+            await self.feed("carousel", u.callback(user_id, CarouselCallback(forward=True).pack()))
+        await self.feed("carousel", u.callback(user_id, CarouselCallback(forward=False).pack()))
+
+        await self.feed("add_to_cart", u.callback(user_id, AssetCallback(action="cart", product_id=product[0]).pack()))
+        await self.feed("add_to_cart", u.callback(user_id, CartCallback(action="show").pack()))
+
+        # Баланс для оплаты пополняется вне замера
+        await database.update_user_balance(user_id, product[4])
+        await self.feed("checkout", u.callback(user_id, CheckoutCallback().pack()))
+
+        for action in ("show", "top_up"):
+            await self.feed("top_up", u.callback(user_id, BalanceCallback(action=action).pack()))
+
+
+STARTUP_PROBE = """
+import time
+start = time.perf_counter()
+import main
+main.register_handlers(main.dp)
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def measure_startup_ms(runs=3):
+    # Каждый замер — в новом интерпретаторе, чтобы импорты не попадали в кэш модулей
+    results = []
+    for _ in range(runs):
+        probe = subprocess.run([sys.executable, "-c", STARTUP_PROBE], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)), env=os.environ)
+        if probe.returncode != 0:
+            raise RuntimeError(f"startup probe failed:\n{probe.stderr}")
+        results.append(float(probe.stdout))
+    return min(results)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(latencies, elapsed, calls):
+    total = sum(len(values) for values in latencies.values())
+    result = {"updates": total, "elapsed_s": elapsed, "throughput_ups": total / elapsed, "flows": {},
+              "api_calls": dict(calls)}
+    for flow, values in latencies.items():
+        result["flows"][flow] = {
+            "updates": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    return result
+
+
+def print_report(result):
+    print(f"{result['updates']} updates in {result['elapsed_s']:.2f} s: {result['throughput_ups']:.1f} updates/s")
+    print(f"startup: {result['startup_ms']:.1f} ms")
+    writes = result["write_batches"]
+    print(f"coalesced writes: {writes['operations']} in {writes['batches']} commits, "
+          f"{writes['mean_batch']:.1f} per batch, {writes['mean_commit_ms']:.2f} ms per commit")
+    print(f"{'flow':<12}{'updates':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for flow, stats in result["flows"].items():
+        print(f"{flow:<12}{stats['updates']:>9}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+async def run(args):
+    paid_categories = await seed(args.categories, args.products)
+    session = FakeSession()
+    if args.rate_limit:
+        from outbound import OutboundRateLimiter
+        session.middleware(OutboundRateLimiter())
+    # Обработчики шлют админу и выдают ассеты через main.bot, поэтому подменяется его сессия
+    main.bot.session = session
+    main.register_handlers(main.dp)
+    runner = Runner(main.bot, main.dp, paid_categories, args.swipes)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    user_ids = [ADMIN_ID + 1 + n for n in range(args.users)]
+
+    async def limited(user_id):
+        async with semaphore:
+            await runner.run_user(user_id)
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        await asyncio.gather(*(limited(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - start
+
+    await main.dp.fsm.close()
+    await database.close_db()
+    result = report(runner.latencies, elapsed, session.calls)
+    result["write_batches"] = database.coalescer.stats()
+    result["startup_ms"] = measure_startup_ms()
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--swipes", type=int, default=5)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=100, help="ассетов на категорию")
+    parser.add_argument("--rate-limit", action="store_true", help="включить OutboundRateLimiter")
+    parser.add_argument("--json", help="записать отчёт в JSON-файл")
+    parser.add_argument("--max-p95-ms", type=float, help="порог p95 для любого сценария")
+    parser.add_argument("--max-startup-ms", type=float, help="порог времени импорта main и регистрации роутеров")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.max_p95_ms is not None:
+        slow = [flow for flow, stats in result["flows"].items() if stats["p95_ms"] > args.max_p95_ms]
+        if slow:
+            print(f"p95 above {args.max_p95_ms} ms: {', '.join(slow)}", file=sys.stderr)
+            sys.exit(1)
+    if args.max_startup_ms is not None and result["startup_ms"] > args.max_startup_ms:
+        print(f"startup {result['startup_ms']:.1f} ms above {args.max_startup_ms} ms", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
+
+from config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_BATCH, BROADCAST_PROGRESS_INTERVAL
+from database import create_broadcast, get_broadcast, get_running_broadcasts, get_broadcast_recipients, \
+    record_broadcast_batch, finish_broadcast
+from outbound import TokenBucket
+from supervisor import owns
+
+_running = {}
+
+
+def _progress_text(job, started, sent_at_start):
+    done = job['sent'] + job['failed'] + job['blocked']
+    elapsed = max(time.monotonic() - started, 1e-6)
+    rate = (job['sent'] - sent_at_start) / elapsed
+    status = {'running': "идёт", 'done': "завершена ✅", 'cancelled': "остановлена ⛔"}[job['status']]
+    return (f"<b>📣 Рассылка #{job['id']}</b> — {status}\n"
+            f"Обработано: {done} из ~{job['total']}\n"
+            f"Доставлено: {job['sent']}, заблокировали бота: {job['blocked']}, ошибок: {job['failed']}\n"
+            f"Скорость: {rate:.1f} сообщ./с")
+
+
+class Broadcast:
+    """Выполнение одного задания рассылки.
+
+    Получатели читаются из users пачками по возрастанию user_id. Внутри пачки
+    сообщения уходят параллельно, не больше concurrency одновременно и не
+    быстрее rate в секунду. После каждой пачки статусы и позиция задания
+    сохраняются в базе, так что после перезапуска рассылка продолжается со
+    следующей пачки. При остановке бота сохраняются и статусы недосланной
+    пачки; повторное сообщение возможно только при аварийном завершении процесса.
+    """
+
+    def __init__(self, bot: Bot, job_id, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY,
+                 batch_size=BROADCAST_BATCH, progress_interval=BROADCAST_PROGRESS_INTERVAL):
+        self.bot = bot
+        self.job_id = job_id
+        self.bucket = TokenBucket(rate, rate)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.progress_message_id = None
+
+    async def _send(self, job, user_id):
+        async with self.semaphore:
+            delay = self.bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                if job['source_message_id']:
+                    await self.bot.copy_message(user_id, job['source_chat_id'], job['source_message_id'])
+                else:
+                    await self.bot.send_message(user_id, job['text'])
+            except TelegramForbiddenError as e:
+                return user_id, 'blocked', e.message
+            except TelegramBadRequest as e:
+                if "chat not found" in e.message.lower():
+                    return user_id, 'blocked', e.message
+                return user_id, 'failed', e.message
+            except TelegramAPIError as e:
+                return user_id, 'failed', str(e)
+            return user_id, 'sent', None
+
+    async def _report(self, job, started, sent_at_start):
+        text = _progress_text(job, started, sent_at_start)
+        try:
+            if self.progress_message_id is None:
+                message = await self.bot.send_message(job['admin_chat_id'], text)
+                self.progress_message_id = message.message_id
+            else:
+                await self.bot.edit_message_text(text, chat_id=job['admin_chat_id'],
+                                                 message_id=self.progress_message_id)
+        except TelegramAPIError:
+            logging.warning("Could not report progress of broadcast %s", self.job_id, exc_info=True)
+
+    async def _send_batch(self, job, recipients):
+        tasks = [asyncio.ensure_future(self._send(job, user_id)) for user_id in recipients]
+        try:
+            results = await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            # Позиция не сдвигается, но уже доставленные сообщения запоминаются
+            finished = [task.result() for task in tasks if task.done() and not task.cancelled()]
+            await record_broadcast_batch(self.job_id, job['last_user_id'], finished)
+            raise
+        await record_broadcast_batch(self.job_id, recipients[-1], results)
+
+    async def run(self):
+        job = await get_broadcast(self.job_id)
+        started, sent_at_start = time.monotonic(), job['sent']
+        await self._report(job, started, sent_at_start)
+        reported = time.monotonic()
+        while job['status'] == 'running':
+            recipients = await get_broadcast_recipients(self.job_id, job['last_user_id'], self.batch_size)
+            if not recipients:
+                await finish_broadcast(self.job_id, 'done')
+            else:
+                await self._send_batch(job, recipients)
+            # Статус перечитывается каждую пачку: так видна отмена из /broadcast_cancel
+            job = await get_broadcast(self.job_id)
+            if job['status'] != 'running' or time.monotonic() - reported >= self.progress_interval:
+                await self._report(job, started, sent_at_start)
+                reported = time.monotonic()
+        logging.info("Broadcast %s %s: %s sent, %s blocked, %s failed",
+                     self.job_id, job['status'], job['sent'], job['blocked'], job['failed'])
+
+
+def _schedule(bot: Bot, job_id):
+    if job_id in _running:
+        return
+    task = asyncio.create_task(Broadcast(bot, job_id).run())
+    _running[job_id] = task
+
+    def done(task):
+        _running.pop(job_id, None)
+        if not task.cancelled() and task.exception():
+            logging.error("Broadcast %s crashed, it will resume on next start", job_id, exc_info=task.exception())
+
+    task.add_done_callback(done)
+
+
+async def start_broadcast(bot: Bot, admin_chat_id, text=None, source_chat_id=None, source_message_id=None):
+    job_id = await create_broadcast(admin_chat_id, text, source_chat_id, source_message_id)
+    _schedule(bot, job_id)
+    return job_id
+
+
+async def cancel_broadcast(job_id):
+    # Задача заметит отмену после текущей пачки и сама пришлёт итог
+    return await finish_broadcast(job_id, 'cancelled')
+
+
+async def schedule_resume_broadcasts(bot: Bot):
+    for job_id, admin_chat_id in await get_running_broadcasts():
+        # Рассылку ведёт воркер администратора, запустившего её: туда же придёт /broadcast_cancel
+        if not owns(admin_chat_id):
+            continue
+        logging.info("Resuming broadcast %s", job_id)
+        _schedule(bot, job_id)
+
+
+async def stop_broadcasts():
+    # При остановке бота задания остаются в статусе running и продолжатся при запуске
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,78 @@
+from aiogram.filters.callback_data import CallbackData
+
+
+# Меню: main — главное, catalog — выбор раздела, support — вопрос менеджеру
+class MenuCallback(CallbackData, prefix="menu"):
+    target: str
+
+
+# Каталог. Списки и сетки листаются по ключу: cursor — id последней строки страницы
+# для перехода вперёд (forward) или первой для перехода назад, 0 — первая страница
+class SectionCallback(CallbackData, prefix="section"):
+    section: str
+    cursor: int = 0
+    forward: bool = True
+
+
+class CategoryCallback(CallbackData, prefix="category"):
+    category_id: int
+    cursor: int = 0
+    forward: bool = True
+
+
+class CarouselCallback(CallbackData, prefix="carousel"):
+    forward: bool
+
+
+# get — забрать бесплатный ассет, cart — положить платный в корзину, open — открыть карточку из сетки
+class AssetCallback(CallbackData, prefix="asset"):
+    action: str
+    product_id: int
+
+
+# open — открыть найденный ассет (value — его id), page — страница выдачи (value — смещение)
+class SearchCallback(CallbackData, prefix="search"):
+    action: str
+    value: int
+
+
+# Корзина и оформление заказа
+class CartCallback(CallbackData, prefix="cart"):
+    action: str
+
+
+class CheckoutCallback(CallbackData, prefix="checkout"):
+    pass
+
+
+# Баланс: show, top_up, sbp
+class BalanceCallback(CallbackData, prefix="balance"):
+    action: str
+
+
+# Администрирование
+class NewCategoryCallback(CallbackData, prefix="new_category"):
+    section: str
+
+
+# add_product — категория нового ассета, delete — удалить категорию, delete_product — выбрать ассет для удаления
+class AdminCategoryCallback(CallbackData, prefix="admin_category"):
+    action: str
+    category_id: int
+
+
+# Страница списка для администратора: action — действие с выбранной категорией
+# (add_product, delete, delete_product) или products — ассеты category_id для удаления
+class AdminPageCallback(CallbackData, prefix="admin_page"):
+    action: str
+    category_id: int = 0
+    cursor: int = 0
+    forward: bool = True
+
+
+class DeleteProductCallback(CallbackData, prefix="delete_product"):
+    product_id: int
+
+
+class BroadcastCallback(CallbackData, prefix="broadcast"):
+    confirm: bool
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+
+
+class CatalogCache:
+    """Ограниченный LRU-кэш каталога с номером версии.
+
+    Версия растёт при каждом изменении каталога. Результат чтения из базы
+    сохраняется только если версия не менялась с начала чтения, поэтому
+    запрос, пересёкшийся с удалением или добавлением, не вернёт в кэш
+    устаревшие данные.
+
+    replace и discard меняют одну запись: они отклоняют только чтения этого
+    ключа, начатые раньше, а не чтения всего кэша.
+
+    Запись можно положить в группу: invalidate с ключом группы удаляет
+    все её записи, поэтому родственные записи хранятся под отдельными
+    ключами и вытесняются по одной.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._groups = {}
+        self._group_of = {}
+        # Версия последнего изменения всего кэша и версии изменений отдельных ключей
+        self._cleared = 0
+        self._touched = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, version, group=None):
+        if version < self._cleared or self._touched.get(key, version) > version:
+            return
+        self._store(key, value, group)
+
+    def replace(self, key, value):
+        """Кладёт заведомо свежее значение, записанное в базу после начала текущих чтений."""
+        self._touch(key)
+        self._store(key, value, None)
+
+    def discard(self, key):
+        self._touch(key)
+        self._drop(key)
+
+    def _touch(self, key):
+        self.version += 1
+        self._touched[key] = self.version
+        self._touched.move_to_end(key)
+        while len(self._touched) > self.maxsize:
+            # Забытое изменение ключа отклоняет все чтения, начатые до него
+            _, version = self._touched.popitem(last=False)
+            self._cleared = max(self._cleared, version)
+
+    def _store(self, key, value, group):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if group is not None:
+            self._groups.setdefault(group, set()).add(key)
+            self._group_of[key] = group
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        group = self._group_of.pop(key, None)
+        if group is not None:
+            members = self._groups[group]
+            members.discard(key)
+            if not members:
+                del self._groups[group]
+
+    def invalidate(self, *keys):
+        self.version += 1
+        self._cleared = self.version
+        self._touched.clear()
+        for key in keys:
+            self._drop(key)
+            for member in self._groups.pop(key, ()):
+                self._entries.pop(member, None)
+                self._group_of.pop(member, None)
+
+    def clear(self):
+        self.version += 1
+        self._cleared = self.version
+        self._touched.clear()
+        self._entries.clear()
+        self._groups.clear()
+        self._group_of.clear()
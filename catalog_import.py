@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+import math
+
+SECTIONS = ('free', 'paid')
+FIELDS = ('category', 'section', 'name', 'description', 'price', 'photo', 'asset')
+MAX_FIELD_LENGTH = 1024
+MAX_MANIFEST_SIZE = 5 * 1024 * 1024
+
+
+class ManifestError(ValueError):
+    """Манифест нельзя разобрать целиком: неверный формат или нет обязательных колонок."""
+
+
+def parse_manifest(file_name, content):
+    """Разбирает CSV или JSON манифест в список (номер строки, словарь полей).
+
+    CSV — с заголовком из колонок FIELDS, JSON — список объектов с теми же
+    ключами или объект со списком в поле "products".
+    """
+    try:
+        text = content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ManifestError("Файл должен быть в кодировке UTF-8")
+    if file_name.lower().endswith('.json'):
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ManifestError(f"Некорректный JSON: {e}")
+        if isinstance(data, dict):
+            data = data.get('products')
+        if not isinstance(data, list):
+            raise ManifestError('Ожидается список ассетов или объект с полем "products"')
+        return [(number, row) for number, row in enumerate(data, start=1)]
+    if file_name.lower().endswith('.csv'):
+        # Excel в русской локали сохраняет CSV через точку с запятой
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+        missing = {'category', 'name', 'photo', 'asset'} - set(reader.fieldnames or ())
+        if missing:
+            raise ManifestError(f"Нет колонок: {', '.join(sorted(missing))}")
+        # Номер строки файла с учётом заголовка
+        return [(number, row) for number, row in enumerate(reader, start=2)]
+    raise ManifestError("Поддерживаются только файлы .csv и .json")
+
+
+def validate_row(row):
+    """Возвращает (category, section, name, description, price, photo, asset, is_free) или текст ошибки."""
+    if not isinstance(row, dict):
+        return None, "запись должна быть объектом"
+    values = {}
+    for field in FIELDS:
+        value = row.get(field)
+        value = '' if value is None else str(value).strip()
+        if len(value) > MAX_FIELD_LENGTH:
+            return None, f"поле {field} длиннее {MAX_FIELD_LENGTH} символов"
+        values[field] = value
+    for field in ('category', 'name', 'photo', 'asset'):
+        if not values[field]:
+            return None, f"не заполнено поле {field}"
+    for field in ('photo', 'asset'):
+        if any(char.isspace() for char in values[field]):
+            return None, f"поле {field} не похоже на file_id"
+    try:
+        price = float(values['price'].replace(',', '.')) if values['price'] else 0.0
+    except ValueError:
+        return None, f"некорректная цена {values['price']!r}"
+    if not math.isfinite(price) or price < 0:
+        return None, "цена должна быть неотрицательным числом"
+    section = values['section'].lower() or ('free' if price == 0 else 'paid')
+    if section not in SECTIONS:
+        return None, f"раздел должен быть free или paid, а не {values['section']!r}"
+    if section == 'free':
+        # Как и в диалоге добавления ассета, в бесплатном разделе цена всегда нулевая
+        price = 0.0
+    return (values['category'], section, values['name'], values['description'], price,
+            values['photo'], values['asset'], 1 if price == 0 else 0), None
+
+
+def validate_manifest(entries):
+    """Делит записи манифеста на годные строки и ошибки (номер строки, текст)."""
+    rows, errors = [], []
+    for number, entry in entries:
+        row, error = validate_row(entry)
+        if error:
+            errors.append((number, error))
+        else:
+            rows.append(row)
+    return rows, errors
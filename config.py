@@ -5,3 +5,90 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID"))
+
+# База данных
+DB_PATH = os.getenv("DB_PATH", "bot.db")
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "4096"))
+CART_CACHE_SIZE = int(os.getenv("CART_CACHE_SIZE", "10000"))
+# Сколько секунд помнить ключи идемпотентности операций с балансом и заказами
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(7 * 24 * 3600)))
+# Журнал баланса: как часто хвост журнала сворачивается в снимки балансов (и сколько
+# транзакций за одну запись) и как часто снимки сверяются с журналом целиком
+LEDGER_SNAPSHOT_INTERVAL = float(os.getenv("LEDGER_SNAPSHOT_INTERVAL", "60"))
+LEDGER_SNAPSHOT_BATCH = int(os.getenv("LEDGER_SNAPSHOT_BATCH", "10000"))
+LEDGER_RECONCILE_INTERVAL = float(os.getenv("LEDGER_RECONCILE_INTERVAL", str(24 * 3600)))
+# Групповая фиксация мелких записей: какие операции через неё идут (register_user, add_to_cart,
+# clear_cart, fsm; записи в журнал баланса balance и order — по желанию), сколько операций
+# в пачке максимум и сколько секунд пачка ждёт следующих
+WRITE_COALESCE = frozenset(
+    filter(None, os.getenv("WRITE_COALESCE", "register_user,add_to_cart,clear_cart,fsm").split(",")))
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "64"))
+WRITE_BATCH_DELAY = float(os.getenv("WRITE_BATCH_DELAY", "0.003"))
+
+# ЮKassa
+YOOKASSA_SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
+YOOKASSA_SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
+YOOKASSA_API_URL = os.getenv("YOOKASSA_API_URL", "https://api.yookassa.ru/v3")
+YOOKASSA_RETURN_URL = os.getenv("YOOKASSA_RETURN_URL", "https://your-bot-domain.com/return")
+YOOKASSA_TIMEOUT = float(os.getenv("YOOKASSA_TIMEOUT", "10"))
+YOOKASSA_RETRIES = int(os.getenv("YOOKASSA_RETRIES", "3"))
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Обязателен в режиме webhook: без него бот не запустится
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
+# Сколько апдейтов обрабатывается одновременно в режиме polling; 0 — без ограничения.
+# Апдейты одного пользователя всё равно выполняются по очереди (UserEventIsolation)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "0"))
+
+# Число процессов-воркеров. При WORKERS > 1 main.py запускает супервизор, который сам
+# получает апдейты и раздаёт их воркерам по id пользователя; WORKER_INDEX он задаёт воркерам сам
+WORKERS = max(int(os.getenv("WORKERS", "1")), 1)
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "-1"))
+# Как часто воркер проверяет, не изменил ли каталог другой процесс
+CACHE_EPOCH_INTERVAL = float(os.getenv("CACHE_EPOCH_INTERVAL", "1.0"))
+
+# Хранилище состояний FSM
+FSM_TTL = int(os.getenv("FSM_TTL", str(7 * 24 * 3600)))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))
+FSM_FLUSH_BATCH = int(os.getenv("FSM_FLUSH_BATCH", "500"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "50000"))
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "2048"))
+
+# Лимиты исходящих сообщений Telegram
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_GROUP_RATE = float(os.getenv("SEND_GROUP_RATE", str(20 / 60)))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "5"))
+# Рассылки идут медленнее общего лимита, чтобы ответы пользователям не вставали в очередь за ними
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+BROADCAST_BATCH = int(os.getenv("BROADCAST_BATCH", "100"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))
+# Как часто, в секундах, повторяется выдача заказов, прерванная ошибкой Telegram
+DELIVERY_RETRY_INTERVAL = float(os.getenv("DELIVERY_RETRY_INTERVAL", "60"))
+
+# Метрики Prometheus отдаёт отдельный сервер, если задан METRICS_PORT. Он без авторизации,
+# поэтому по умолчанию слушает только localhost, а не порт вебхука
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+
+# Поиск по ассетам: результатов на страницу в /search и в inline-режиме (не больше 50)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "8"))
+INLINE_PAGE_SIZE = min(int(os.getenv("INLINE_PAGE_SIZE", "20")), 50)
+# Последнее слово запроса ищется как префикс, только если в нём не меньше символов
+SEARCH_MIN_PREFIX = int(os.getenv("SEARCH_MIN_PREFIX", "2"))
+
+# Постраничные списки: строк на странице списков категорий и ассетов
+# и ассетов в одной сетке миниатюр (не больше 10 — предел медиагруппы)
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "10"))
+GRID_PAGE_SIZE = min(int(os.getenv("GRID_PAGE_SIZE", "10")), 10)
@@ -1,225 +1,713 @@
-import aiosqlite
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import defaultdict
 from datetime import datetime
+from config import DB_PATH, DB_READERS, CATALOG_CACHE_SIZE, CART_CACHE_SIZE, SEARCH_MIN_PREFIX, IDEMPOTENCY_TTL, \
+    CACHE_EPOCH_INTERVAL, LEDGER_SNAPSHOT_INTERVAL, LEDGER_SNAPSHOT_BATCH, LEDGER_RECONCILE_INTERVAL, \
+    WRITE_COALESCE, WRITE_BATCH_SIZE, WRITE_BATCH_DELAY
+from db_pool import ConnectionPool, WriteCoalescer
+from catalog_cache import CatalogCache
+from metrics import DB_QUERY_SECONDS, timed
+from migrations import migrate, fill_sales_aggregates
+
+pool = ConnectionPool(DB_PATH, readers=DB_READERS)
+coalescer = WriteCoalescer(pool, WRITE_BATCH_SIZE, WRITE_BATCH_DELAY)
+catalog = CatalogCache(CATALOG_CACHE_SIZE)
+# Корзины по user_id: (items, total), items — кортежи (product_id, name, price, quantity)
+carts = CatalogCache(CART_CACHE_SIZE)
+_background_tasks = set()
+# Последний известный этому процессу номер версии каталога в cache_epochs
+_catalog_epoch = None
+timed_query = timed(DB_QUERY_SECONDS, 'query')
+
 
 async def init_db():
-    async with aiosqlite.connect('bot.db') as db:
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                balance REAL DEFAULT 0.0
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY,
-                name TEXT,
-                section TEXT
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY,
-                category_id INTEGER,
-                name TEXT,
-                description TEXT,
-                price REAL,
-                photo TEXT,
-                asset_url TEXT,
-                is_free INTEGER DEFAULT 0
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS cart_items (
-                user_id INTEGER,
-                product_id INTEGER,
-                quantity INTEGER,
-                PRIMARY KEY (user_id, product_id)
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS orders (
-                id INTEGER PRIMARY KEY,
-                user_id INTEGER,
-                status TEXT,
-                payment_method TEXT,
-                total_price REAL,
-                created_at TEXT
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS order_items (
-                order_id INTEGER,
-                product_id INTEGER,
-                quantity INTEGER,
-                price_at_purchase REAL
-            )
-        ''')
-        # Migrate existing orders table if it contains unused columns
-        try:
-            async with db.execute('PRAGMA table_info(orders)') as cursor:
-                columns = [row[1] for row in await cursor.fetchall()]
-            if 'delivery_method' in columns or 'name' in columns or 'phone' in columns or 'city' in columns:
-                await db.execute('ALTER TABLE orders RENAME TO orders_old')
-                await db.execute('''
-                    CREATE TABLE orders (
-                        id INTEGER PRIMARY KEY,
-                        user_id INTEGER,
-                        status TEXT,
-                        payment_method TEXT,
-                        total_price REAL,
-                        created_at TEXT
-                    )
-                ''')
-                await db.execute('''
-                    INSERT INTO orders (id, user_id, status, payment_method, total_price, created_at)
-                    SELECT id, user_id, status, payment_method, total_price, created_at
-                    FROM orders_old
-                ''')
-                await db.execute('DROP TABLE orders_old')
-        except aiosqlite.Error:
-            pass  # Ignore if migration fails (e.g., table doesn't exist yet)
+    await pool.open()
+    async with pool.write() as db:
+        await migrate(db)
+        await db.execute('DELETE FROM idempotency_keys WHERE created_at<?', (time.time() - IDEMPOTENCY_TTL,))
+        await db.commit()
+
+async def _write(name, operation):
+    # Операции из WRITE_COALESCE фиксируются пачками, остальные — своей транзакцией.
+    # В обоих случаях operation выполняется под BEGIN IMMEDIATE, поэтому прочитанное
+    # ею до записи не изменят другие процессы
+    if name in WRITE_COALESCE:
+        return await coalescer.submit(operation)
+    async with pool.write() as db:
+        await db.execute('BEGIN IMMEDIATE')
+        result = await operation(db)
         await db.commit()
+        return result
+
+async def _replayed(db, key):
+    # Результат операции, уже выполненной с этим ключом, или None.
+    # Вызывается внутри транзакции записи, поэтому проверка и запись ключа атомарны
+    if key is None:
+        return None
+    async with db.execute('SELECT result FROM idempotency_keys WHERE key=?', (key,)) as cursor:
+        row = await cursor.fetchone()
+    return json.loads(row[0]) if row else None
+
+async def _remember(db, key, result):
+    if key is not None:
+        await db.execute('INSERT INTO idempotency_keys (key, result, created_at) VALUES (?, ?, ?)',
+                         (key, json.dumps(result), time.time()))
+
+@timed_query
+async def _bump_catalog_epoch(db):
+    # Вызывается в транзакции изменения каталога, до commit
+    global _catalog_epoch
+    async with db.execute(
+        "UPDATE cache_epochs SET version=version+1 WHERE name='catalog' RETURNING version"
+    ) as cursor:
+        version = (await cursor.fetchone())[0]
+    # Свои изменения кэш уже учёл; если версию успел сменить другой процесс, кэш сбросит watch_catalog_epoch
+    if _catalog_epoch is not None and version == _catalog_epoch + 1:
+        _catalog_epoch = version
+
+async def watch_catalog_epoch(interval):
+    """Сбрасывает кэши каталога и корзин, когда каталог изменил другой процесс."""
+    global _catalog_epoch
+    while True:
+        async with pool.read() as db:
+            async with db.execute("SELECT version FROM cache_epochs WHERE name='catalog'") as cursor:
+                version = (await cursor.fetchone())[0]
+        if _catalog_epoch is not None and version != _catalog_epoch:
+            catalog.clear()
+            carts.clear()
+        _catalog_epoch = version
+        await asyncio.sleep(interval)
+
+async def schedule_watch_catalog_epoch(interval=CACHE_EPOCH_INTERVAL):
+    task = asyncio.create_task(watch_catalog_epoch(interval))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
+def to_minor(amount):
+    """Рубли в целые копейки, в которых хранится журнал баланса."""
+    return round(amount * 100)
+
+async def _balance(db, user_id):
+    # Снимок плюс транзакции после него; хвост читается по индексу (user_id, id)
+    async with db.execute('''
+        SELECT COALESCE(s.balance, 0) + COALESCE((
+            SELECT SUM(t.amount) FROM balance_transactions t
+            WHERE t.user_id = u.user_id AND t.id > COALESCE(s.last_transaction_id, 0)
+        ), 0)
+        FROM (SELECT ? AS user_id) u LEFT JOIN balance_snapshots s ON s.user_id = u.user_id
+    ''', (user_id,)) as cursor:
+        return (await cursor.fetchone())[0]
+
+async def _append_transactions(db, rows):
+    # rows — кортежи (user_id, amount в копейках, kind, order_id); журнал только дописывается
+    created_at = datetime.now().isoformat()
+    await db.executemany(
+        'INSERT INTO balance_transactions (user_id, amount, kind, order_id, created_at) VALUES (?, ?, ?, ?, ?)',
+        [row + (created_at,) for row in rows]
+    )
+
+@timed_query
 async def get_user_balance(user_id):
-    async with aiosqlite.connect('bot.db') as db:
-        async with db.execute('SELECT balance FROM users WHERE user_id=?', (user_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return row[0]
-            else:
-                await db.execute('INSERT INTO users (user_id, balance) VALUES (?, 0.0)', (user_id,))
-                await db.commit()
-                return 0.0
-
-async def update_user_balance(user_id, amount):
-    async with aiosqlite.connect('bot.db') as db:
-        async with db.execute('SELECT balance FROM users WHERE user_id=?', (user_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                new_balance = row[0] + amount
-                if new_balance < 0:
-                    return False
-                await db.execute('UPDATE users SET balance=? WHERE user_id=?', (new_balance, user_id))
-            else:
-                if amount < 0:
-                    return False
-                await db.execute('INSERT INTO users (user_id, balance) VALUES (?, ?)', (user_id, amount))
+    async with pool.read() as db:
+        async with db.execute('SELECT 1 FROM users WHERE user_id=?', (user_id,)) as cursor:
+            known = await cursor.fetchone() is not None
+        balance = await _balance(db, user_id)
+    if not known:
+        async def register(db):
+            await db.execute('INSERT OR IGNORE INTO users (user_id) VALUES (?)', (user_id,))
+        await _write('register_user', register)
+    return balance / 100
+
+@timed_query
+async def update_user_balance(user_id, amount, idempotency_key=None, kind=None):
+    """Дописывает в журнал изменение баланса на amount рублей; списание не уводит баланс в минус.
+
+    kind — вид операции в журнале (top_up, admin_top_up, refund...). Повторный
+    вызов с тем же idempotency_key ничего не меняет и возвращает результат первого вызова.
+    """
+    amount = to_minor(amount)
+
+    async def append(db):
+        replayed = await _replayed(db, idempotency_key)
+        if replayed is not None:
+            return replayed
+        # Операция идёт в транзакции записи, поэтому проверка и добавление атомарны
+        if amount < 0 and await _balance(db, user_id) + amount < 0:
+            return False
+        await db.execute('INSERT OR IGNORE INTO users (user_id) VALUES (?)', (user_id,))
+        await _append_transactions(db, [(user_id, amount, kind or ('top_up' if amount >= 0 else 'debit'), None)])
+        await _remember(db, idempotency_key, True)
+        return True
+    return await _write('balance', append)
+
+@timed_query
+async def get_balance_transactions(user_id, limit):
+    """Последние транзакции пользователя: (id, amount в копейках, kind, order_id, created_at)."""
+    async with pool.read() as db:
+        async with db.execute('''
+            SELECT id, amount, kind, order_id, created_at FROM balance_transactions
+            WHERE user_id=? ORDER BY id DESC LIMIT ?
+        ''', (user_id, limit)) as cursor:
+            return await cursor.fetchall()
+
+async def snapshot_balances(batch_size=LEDGER_SNAPSHOT_BATCH):
+    """Сворачивает новые транзакции журнала в снимки балансов, не больше batch_size за одну запись.
+
+    Возвращает число свёрнутых транзакций.
+    """
+    folded = 0
+    while True:
+        async with pool.write() as db:
+            await db.execute('BEGIN IMMEDIATE')
+            async with db.execute('''
+                SELECT c.last_transaction_id, MIN(c.last_transaction_id + ?, (SELECT COALESCE(MAX(id), 0)
+                                                                              FROM balance_transactions))
+                FROM ledger_checkpoint c
+            ''', (batch_size,)) as cursor:
+                start, end = await cursor.fetchone()
+            if end <= start:
+                await db.rollback()
+                return folded
+            await db.execute('''
+                INSERT INTO balance_snapshots (user_id, balance, last_transaction_id, updated_at)
+                SELECT t.user_id, SUM(t.amount), MAX(t.id), ?
+                FROM balance_transactions t WHERE t.id > ? AND t.id <= ?
+                GROUP BY t.user_id
+                ON CONFLICT (user_id) DO UPDATE SET
+                    balance = balance + excluded.balance,
+                    last_transaction_id = excluded.last_transaction_id,
+                    updated_at = excluded.updated_at
+            ''', (datetime.now().isoformat(), start, end))
+            await db.execute('UPDATE ledger_checkpoint SET last_transaction_id=?', (end,))
             await db.commit()
-            return True
+        folded += end - start
+
+async def reconcile_balances():
+    """Сверяет снимки с суммой журнала и чинит расхождения; журнал считается верным.
 
+    Возвращает список (user_id, баланс снимка, баланс по журналу) в копейках.
+    """
+    async with pool.write() as db:
+        await db.execute('BEGIN IMMEDIATE')
+        async with db.execute('''
+            SELECT s.user_id, s.balance, COALESCE((
+                SELECT SUM(t.amount) FROM balance_transactions t
+                WHERE t.user_id = s.user_id AND t.id <= s.last_transaction_id
+            ), 0) AS ledger
+            FROM balance_snapshots s
+            WHERE s.balance != ledger
+        ''') as cursor:
+            mismatches = await cursor.fetchall()
+        await db.executemany('UPDATE balance_snapshots SET balance=?, updated_at=? WHERE user_id=?', [
+            (ledger, datetime.now().isoformat(), user_id) for user_id, _, ledger in mismatches
+        ])
+        await db.commit()
+    for user_id, snapshot, ledger in mismatches:
+        logging.error("Balance snapshot of user %s was %s, ledger says %s; snapshot repaired", user_id, snapshot, ledger)
+    return mismatches
+
+async def run_ledger_jobs(snapshot_interval=LEDGER_SNAPSHOT_INTERVAL, reconcile_interval=LEDGER_RECONCILE_INTERVAL):
+    last_reconcile = time.monotonic()
+    while True:
+        await asyncio.sleep(snapshot_interval)
+        try:
+            await snapshot_balances()
+            if time.monotonic() - last_reconcile >= reconcile_interval:
+                await reconcile_balances()
+                last_reconcile = time.monotonic()
+        except Exception:
+            logging.exception("Ledger maintenance failed")
+
+async def schedule_ledger_jobs():
+    task = asyncio.create_task(run_ledger_jobs())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+@timed_query
 async def get_categories(section=None):
-    async with aiosqlite.connect('bot.db') as db:
+    key = ('categories', section or None)
+    cached = catalog.get(key)
+    if cached is not None:
+        return cached
+    version = catalog.version
+    async with pool.read() as db:
         if section:
-            async with db.execute('SELECT id, name FROM categories WHERE section=?', (section,)) as cursor:
-                return await cursor.fetchall()
+            async with db.execute('SELECT id, name, section FROM categories WHERE section=?', (section,)) as cursor:
+                rows = tuple(await cursor.fetchall())
         else:
-            async with db.execute('SELECT id, name FROM categories') as cursor:
-                return await cursor.fetchall()
+            async with db.execute('SELECT id, name, section FROM categories') as cursor:
+                rows = tuple(await cursor.fetchall())
+    catalog.put(key, rows, version)
+    return rows
+
+async def _keyset_page(group, query, params, from_id, forward, limit):
+    # query — SELECT с WHERE, к которому дописывается условие на id. Читается
+    # на строку больше limit: лишняя показывает, есть ли страница дальше в ту же сторону.
+    # Каждая страница — своя запись LRU в группе group и сбрасывается вместе с ней
+    key = group + (from_id, forward, limit)
+    cached = catalog.get(key)
+    if cached is not None:
+        return cached
+    version = catalog.version
+    if forward:
+        query += ' AND id>? ORDER BY id LIMIT ?'
+    else:
+        query += ' AND id<? ORDER BY id DESC LIMIT ?'
+    async with pool.read() as db:
+        async with db.execute(query, params + (from_id, limit + 1)) as cursor:
+            rows = await cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+    page = tuple(rows), has_more
+    catalog.put(key, page, version, group=group)
+    return page
+
+@timed_query
+async def get_categories_page(section, cursor, forward, limit):
+    """Категории раздела (или все при section=None) после id cursor или перед ним: (rows, has_more)."""
+    if section:
+        query, params = 'SELECT id, name, section FROM categories WHERE section=?', (section,)
+    else:
+        query, params = 'SELECT id, name, section FROM categories WHERE 1', ()
+    return await _keyset_page(('category_pages', section or None), query, params, cursor, forward, limit)
 
+@timed_query
+async def get_products_page(category_id, cursor, forward, limit):
+    """Ассеты категории после id cursor или перед ним: (rows, has_more), строки как у get_product."""
+    rows, has_more = await _keyset_page(
+        ('product_pages', category_id),
+        'SELECT id, category_id, name, description, price, photo, asset_url, is_free FROM products '
+        'WHERE category_id=?', (category_id,), cursor, forward, limit
+    )
+    version = catalog.version
+    for row in rows:
+        catalog.put(('product', row[0]), row, version)
+    return rows, has_more
+
+@timed_query
 async def add_category(name, section):
-    async with aiosqlite.connect('bot.db') as db:
+    async with pool.write() as db:
         await db.execute('INSERT INTO categories (name, section) VALUES (?, ?)', (name, section))
+        await _bump_catalog_epoch(db)
         await db.commit()
+    catalog.invalidate(('categories', None), ('categories', section),
+                       ('category_pages', None), ('category_pages', section))
 
+@timed_query
 async def get_products_by_category(category_id):
-    async with aiosqlite.connect('bot.db') as db:
+    key = ('products', category_id)
+    cached = catalog.get(key)
+    if cached is not None:
+        return cached
+    version = catalog.version
+    async with pool.read() as db:
         async with db.execute(
             'SELECT id, category_id, name, description, price, photo, asset_url FROM products WHERE category_id=?',
             (category_id,)
         ) as cursor:
-            return await cursor.fetchall()
+            rows = tuple(await cursor.fetchall())
+    catalog.put(key, rows, version)
+    return rows
 
+@timed_query
 async def add_product(category_id, name, description, price, photo, asset_url, is_free):
-    async with aiosqlite.connect('bot.db') as db:
+    async with pool.write() as db:
         await db.execute(
             '''INSERT INTO products (category_id, name, description, price, photo, asset_url, is_free)
                VALUES (?, ?, ?, ?, ?, ?, ?)''',
             (category_id, name, description, price, photo, asset_url, is_free)
         )
+        await _bump_catalog_epoch(db)
+        await db.commit()
+    catalog.invalidate(('products', category_id), ('neighbours', category_id), ('product_pages', category_id))
+
+@timed_query
+async def import_products(rows):
+    """Добавляет проверенные строки манифеста одной транзакцией, создавая недостающие категории.
+
+    rows — кортежи (category, section, name, description, price, photo, asset_url, is_free).
+    Возвращает (число ассетов, число новых категорий).
+    """
+    async with pool.write() as db:
+        await db.execute('BEGIN IMMEDIATE')
+        async with db.execute('SELECT id, name, section FROM categories') as cursor:
+            category_ids = {(name, section): category_id for category_id, name, section in await cursor.fetchall()}
+        created = 0
+        for name, section in dict.fromkeys((row[0], row[1]) for row in rows):
+            if (name, section) not in category_ids:
+                async with db.execute('INSERT INTO categories (name, section) VALUES (?, ?)', (name, section)) as cursor:
+                    category_ids[(name, section)] = cursor.lastrowid
+                created += 1
+        # Поисковый индекс обновляется триггерами в этой же транзакции
+        await db.executemany('''
+            INSERT INTO products (category_id, name, description, price, photo, asset_url, is_free)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(category_ids[(row[0], row[1])],) + tuple(row[2:]) for row in rows])
+        await _bump_catalog_epoch(db)
         await db.commit()
+    touched = {category_ids[(row[0], row[1])] for row in rows}
+    sections = {row[1] for row in rows}
+    catalog.invalidate(
+        ('categories', None), *(('categories', section) for section in sections),
+        ('category_pages', None), *(('category_pages', section) for section in sections),
+        *(('products', category_id) for category_id in touched),
+        *(('neighbours', category_id) for category_id in touched),
+        *(('product_pages', category_id) for category_id in touched)
+    )
+    return len(rows), created
 
+@timed_query
 async def get_product(product_id):
-    async with aiosqlite.connect('bot.db') as db:
+    key = ('product', product_id)
+    cached = catalog.get(key)
+    if cached is not None:
+        return cached
+    version = catalog.version
+    async with pool.read() as db:
         async with db.execute(
             'SELECT id, category_id, name, description, price, photo, asset_url, is_free FROM products WHERE id=?',
             (product_id,)
         ) as cursor:
-            return await cursor.fetchone()
+            row = await cursor.fetchone()
+    if row is not None:
+        catalog.put(key, row, version)
+    return row
 
+async def _get_neighbour_product(category_id, product_id, forward):
+    # Каждый сосед — своя запись LRU в группе категории, которая сбрасывается
+    # при любом добавлении или удалении ассета в ней. Запись хранится как (row,),
+    # чтобы запомнить и отсутствие соседа
+    key = ('neighbour', category_id, product_id, forward)
+    cached = catalog.get(key)
+    if cached is not None:
+        return cached[0]
+    version = catalog.version
+    if forward:
+        query = ('SELECT id, category_id, name, description, price, photo, asset_url, is_free FROM products '
+                 'WHERE category_id=? AND id>? ORDER BY id LIMIT 1')
+    else:
+        query = ('SELECT id, category_id, name, description, price, photo, asset_url, is_free FROM products '
+                 'WHERE category_id=? AND id<? ORDER BY id DESC LIMIT 1')
+    async with pool.read() as db:
+        async with db.execute(query, (category_id, product_id)) as cursor:
+            row = await cursor.fetchone()
+    if row is not None:
+        catalog.put(('product', row[0]), row, version)
+    catalog.put(key, (row,), version, group=('neighbours', category_id))
+    return row
+
+@timed_query
+async def get_next_product(category_id, after_id=0):
+    return await _get_neighbour_product(category_id, after_id, True)
+
+@timed_query
+async def get_prev_product(category_id, before_id):
+    return await _get_neighbour_product(category_id, before_id, False)
+
+async def _prefetch_neighbours(category_id, product_id):
+    try:
+        await get_next_product(category_id, product_id)
+        await get_prev_product(category_id, product_id)
+    except Exception:
+        logging.exception("Prefetch of neighbours for product %s failed", product_id)
+
+def prefetch_neighbours(category_id, product_id):
+    """Подгружает в кэш соседние ассеты в фоне, чтобы листание не ждало базу."""
+    task = asyncio.create_task(_prefetch_neighbours(category_id, product_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def _match_query(text):
+    # Слова берутся в кавычки, так пользовательский ввод не разбирается как
+    # синтаксис FTS5, и объединяются через AND. Префиксом ищется только последнее
+    # слово, которое ещё набирают: префиксы всех слов раздувают число совпадений,
+    # а bm25 приходится считать для каждого. «ё» заменяется так же, как при индексации
+    text = text.replace('ё', 'е').replace('Ё', 'Е')
+    words = text.split()
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    if terms and len(words[-1]) >= SEARCH_MIN_PREFIX:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+@timed_query
+async def search_products(text, limit, offset=0):
+    """Ассеты, подходящие под запрос, по убыванию релевантности; совпадения в названии весят больше."""
+    match = _match_query(text)
+    if not match:
+        return ()
+    async with pool.read() as db:
+        async with db.execute('''
+            SELECT p.id, p.category_id, p.name, p.description, p.price, p.photo, p.asset_url, p.is_free
+            FROM products_fts f JOIN products p ON p.id = f.rowid
+            WHERE products_fts MATCH ? ORDER BY bm25(products_fts, 10.0, 1.0), p.id LIMIT ? OFFSET ?
+        ''', (match, limit, offset)) as cursor:
+            return tuple(await cursor.fetchall())
+
+@timed_query
 async def delete_category(category_id):
-    async with aiosqlite.connect('bot.db') as db:
-        await db.execute('DELETE FROM products WHERE category_id=?', (category_id,))
+    async with pool.write() as db:
+        async with db.execute('SELECT section FROM categories WHERE id=?', (category_id,)) as cursor:
+            row = await cursor.fetchone()
+        async with db.execute('SELECT id FROM products WHERE category_id=?', (category_id,)) as cursor:
+            product_ids = [r[0] for r in await cursor.fetchall()]
+        # Ассеты категории удаляются каскадно по внешнему ключу products.category_id
         await db.execute('DELETE FROM categories WHERE id=?', (category_id,))
+        await _bump_catalog_epoch(db)
         await db.commit()
+    section = row[0] if row else None
+    catalog.invalidate(
+        ('categories', None), ('categories', section), ('category_pages', None), ('category_pages', section),
+        ('products', category_id), ('neighbours', category_id), ('product_pages', category_id),
+        *(('product', product_id) for product_id in product_ids)
+    )
+    # Строки корзин удалены каскадом, а у каких пользователей — неизвестно
+    carts.clear()
 
+@timed_query
 async def delete_product(product_id):
-    async with aiosqlite.connect('bot.db') as db:
+    async with pool.write() as db:
+        async with db.execute('SELECT category_id FROM products WHERE id=?', (product_id,)) as cursor:
+            row = await cursor.fetchone()
         await db.execute('DELETE FROM products WHERE id=?', (product_id,))
+        await _bump_catalog_epoch(db)
         await db.commit()
+    category_id = row[0] if row else None
+    catalog.invalidate(('product', product_id), ('products', category_id), ('neighbours', category_id),
+                       ('product_pages', category_id))
+    carts.clear()
 
-async def add_to_cart(user_id, product_id, quantity=1):
-    async with aiosqlite.connect('bot.db') as db:
-        async with db.execute('SELECT quantity FROM cart_items WHERE user_id=? AND product_id=?',
-                              (user_id, product_id)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                await db.execute(
-                    'UPDATE cart_items SET quantity=? WHERE user_id=? AND product_id=?',
-                    (row[0] + quantity, user_id, product_id)
-                )
-            else:
-                await db.execute(
-                    'INSERT INTO cart_items (user_id, product_id, quantity) VALUES (?, ?, ?)',
-                    (user_id, product_id, quantity)
-                )
-        await db.commit()
+@timed_query
+async def add_to_cart(user_id, product_id, quantity=1, once=False):
+    """Добавляет ассет в корзину одним UPSERT и возвращает, изменилась ли корзина,
+    или None, если ассета больше нет.
+
+    С once=True ассет, который уже лежит в корзине, повторно не добавляется.
+    """
+    if once:
+        conflict = 'DO NOTHING'
+    else:
+        conflict = 'DO UPDATE SET quantity=quantity+excluded.quantity'
+    product = await get_product(product_id)
+    if product is None:
+        return None
+
+    async def upsert(db):
+        async with db.execute(
+            'INSERT INTO cart_items (user_id, product_id, quantity) VALUES (?, ?, ?) '
+            f'ON CONFLICT (user_id, product_id) {conflict} RETURNING quantity',
+            (user_id, product_id, quantity)
+        ) as cursor:
+            return await cursor.fetchone()
+    try:
+        row = await _write('add_to_cart', upsert)
+    except sqlite3.IntegrityError:
+        # Ассет удалили между чтением и записью
+        return None
+    if row is None:
+        return False
+    # Кэш обновляется после фиксации: чтение этой корзины, начатое раньше,
+    # не положит старую поверх, а корзины других пользователей не затрагиваются
+    cached = carts.get(user_id)
+    if cached is not None:
+        items = [item for item in cached[0] if item[0] != product_id]
+        items.append((product_id, product[2], product[4], row[0]))
+        carts.replace(user_id, _cart(items))
+    else:
+        carts.discard(user_id)
+    return True
+
+def _cart(items):
+    items = tuple(items)
+    return items, sum(price * quantity for _, _, price, quantity in items)
+
+def _set_empty_cart(user_id):
+    carts.replace(user_id, _cart(()))
 
+@timed_query
+async def get_cart(user_id):
+    """Корзина с названиями и ценами ассетов одним запросом: (items, total)."""
+    cached = carts.get(user_id)
+    if cached is not None:
+        return cached
+    version = carts.version
+    async with pool.read() as db:
+        async with db.execute('''
+            SELECT c.product_id, p.name, p.price, c.quantity
+            FROM cart_items c JOIN products p ON p.id = c.product_id
+            WHERE c.user_id=? ORDER BY c.rowid
+        ''', (user_id,)) as cursor:
+            cart = _cart(await cursor.fetchall())
+    carts.put(user_id, cart, version)
+    return cart
+
+@timed_query
 async def get_cart_items(user_id):
-    async with aiosqlite.connect('bot.db') as db:
-        async with db.execute('SELECT product_id, quantity FROM cart_items WHERE user_id=?', (user_id,)) as cursor:
-            return [{'product_id': row[0], 'quantity': row[1]} for row in await cursor.fetchall()]
+    items, _ = await get_cart(user_id)
+    return [{'product_id': product_id, 'quantity': quantity} for product_id, _, _, quantity in items]
 
+@timed_query
 async def clear_cart(user_id):
-    async with aiosqlite.connect('bot.db') as db:
+    async def delete(db):
         await db.execute('DELETE FROM cart_items WHERE user_id=?', (user_id,))
-        await db.commit()
+    await _write('clear_cart', delete)
+    _set_empty_cart(user_id)
 
-async def create_order(user_id, data):
-    cart_items = await get_cart_items(user_id)
-    total_price = 0
-    for item in cart_items:
-        product = await get_product(item['product_id'])
-        total_price += product[4] * item['quantity']
+@timed_query
+async def create_order(user_id, data, idempotency_key=None):
+    """Оформляет заказ из корзины одной транзакцией.
 
-    balance = await get_user_balance(user_id)
-    if balance < total_price:
-        return None, "Недостаточно средств на балансе. 💸 Пожалуйста, пополните баланс."
+    Возвращает (order, error), где order содержит id, total_price, новый
+    balance и items с названиями и файлами ассетов для выдачи. Если заказ
+    с этим idempotency_key уже оформлен, возвращается он же с replayed=True
+    и пустым items, а баланс повторно не списывается.
+    """
+    async def place(db):
+        replayed = await _replayed(db, idempotency_key)
+        if replayed is not None:
+            return dict(replayed, items=[], replayed=True), None
+        async with db.execute('''
+            SELECT c.product_id, c.quantity, p.name, p.price, p.asset_url, p.category_id
+            FROM cart_items c JOIN products p ON p.id = c.product_id
+            WHERE c.user_id=?
+        ''', (user_id,)) as cursor:
+            rows = await cursor.fetchall()
+        items = [
+            {'product_id': row[0], 'quantity': row[1], 'name': row[2], 'price_at_purchase': row[3],
+             'asset_url': row[4]}
+            for row in rows
+        ]
+        if not items:
+            return None, "Ваша корзина пуста. 🛒"
+        total_price = sum(item['price_at_purchase'] * item['quantity'] for item in items)
+        total_minor = sum(to_minor(item['price_at_purchase']) * item['quantity'] for item in items)
 
-    async with aiosqlite.connect('bot.db') as db:
-        await db.execute('UPDATE users SET balance=balance-? WHERE user_id=?', (total_price, user_id))
+        # Баланс читается в транзакции записи, так что между проверкой и списанием его никто не изменит
+        balance = await _balance(db, user_id) - total_minor
+        if balance < 0:
+            return None, "Недостаточно средств на балансе. 💸 Пожалуйста, пополните баланс."
 
+        created_at = datetime.now().isoformat()
         async with db.execute('''
             INSERT INTO orders (user_id, status, payment_method, total_price, created_at)
             VALUES (?, ?, ?, ?, ?)
         ''', (
-            user_id, 'pending', data.get('payment_method', 'Unknown'), total_price, datetime.now().isoformat()
+            user_id, 'pending', data.get('payment_method', 'Unknown'), total_price, created_at
         )) as cursor:
             order_id = cursor.lastrowid
 
-        for item in cart_items:
-            product = await get_product(item['product_id'])
-            await db.execute('''
-                INSERT INTO order_items (order_id, product_id, quantity, price_at_purchase)
-                VALUES (?, ?, ?, ?)
-            ''', (order_id, item['product_id'], item['quantity'], product[4]))
+        await db.executemany('''
+            INSERT INTO order_items (order_id, product_id, quantity, price_at_purchase)
+            VALUES (?, ?, ?, ?)
+        ''', [(order_id, item['product_id'], item['quantity'], item['price_at_purchase']) for item in items])
+        await db.execute('DELETE FROM cart_items WHERE user_id=?', (user_id,))
+        await _record_sale(db, user_id, created_at, rows)
+        await _append_transactions(db, [(user_id, -total_minor, 'purchase', order_id)])
+
+        balance /= 100
+        await _remember(db, idempotency_key, {'id': order_id, 'total_price': total_price, 'balance': balance})
+        return {'id': order_id, 'total_price': total_price, 'balance': balance, 'items': items,
+                'replayed': False}, None
+
+    order, error = await _write('order', place)
+    if order is not None and not order['replayed']:
+        _set_empty_cart(user_id)
+    return order, error
 
+async def _record_sale(db, user_id, created_at, rows):
+    # Обновляет дневные итоги продаж в транзакции заказа;
+    # rows — строки корзины (product_id, quantity, name, price, asset_url, category_id)
+    day = created_at[:10]
+    products = defaultdict(lambda: [0, 0.0])
+    categories = defaultdict(lambda: [0, 0.0])
+    for product_id, quantity, _, price, _, category_id in rows:
+        for totals, key in ((products, product_id), (categories, category_id)):
+            totals[key][0] += quantity
+            totals[key][1] += quantity * price
+    units = sum(units for units, _ in products.values())
+    revenue = sum(revenue for _, revenue in products.values())
+    await db.execute('''
+        INSERT INTO sales_daily (day, orders, units, revenue) VALUES (?, 1, ?, ?)
+        ON CONFLICT (day) DO UPDATE SET
+            orders=orders+1, units=units+excluded.units, revenue=revenue+excluded.revenue
+    ''', (day, units, revenue))
+    await db.executemany('''
+        INSERT INTO sales_daily_products (day, product_id, units, revenue) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, product_id) DO UPDATE SET units=units+excluded.units, revenue=revenue+excluded.revenue
+    ''', [(day, key, units, revenue) for key, (units, revenue) in products.items()])
+    await db.executemany('''
+        INSERT INTO sales_daily_categories (day, category_id, units, revenue) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, category_id) DO UPDATE SET units=units+excluded.units, revenue=revenue+excluded.revenue
+    ''', [(day, key, units, revenue) for key, (units, revenue) in categories.items()])
+    await db.execute('''
+        INSERT INTO user_sales (user_id, orders, spent, last_order_at) VALUES (?, 1, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            orders=orders+1, spent=spent+excluded.spent, last_order_at=excluded.last_order_at
+    ''', (user_id, revenue, created_at))
+
+@timed_query
+async def rebuild_sales_aggregates():
+    async with pool.write() as db:
+        await db.execute('BEGIN IMMEDIATE')
+        await fill_sales_aggregates(db)
         await db.commit()
 
-    await clear_cart(user_id)
-    return order_id, None
+@timed_query
+async def get_sales_summary(since_day):
+    """Итоги продаж с since_day (YYYY-MM-DD) включительно: (orders, units, revenue) и разбивка по дням."""
+    async with pool.read() as db:
+        async with db.execute(
+            'SELECT day, orders, units, revenue FROM sales_daily WHERE day>=? ORDER BY day', (since_day,)
+        ) as cursor:
+            days = await cursor.fetchall()
+    totals = tuple(sum(row[i] for row in days) for i in (1, 2, 3))
+    return totals, days
 
+@timed_query
+async def get_category_sales(since_day):
+    async with pool.read() as db:
+        async with db.execute('''
+            SELECT s.category_id, c.name, SUM(s.units), SUM(s.revenue)
+            FROM sales_daily_categories s LEFT JOIN categories c ON c.id = s.category_id
+            WHERE s.day>=? GROUP BY s.category_id ORDER BY SUM(s.revenue) DESC
+        ''', (since_day,)) as cursor:
+            return await cursor.fetchall()
+
+@timed_query
+async def get_best_sellers(since_day, limit):
+    async with pool.read() as db:
+        async with db.execute('''
+            SELECT s.product_id, p.name, SUM(s.units), SUM(s.revenue)
+            FROM sales_daily_products s LEFT JOIN products p ON p.id = s.product_id
+            WHERE s.day>=? GROUP BY s.product_id ORDER BY SUM(s.units) DESC, SUM(s.revenue) DESC LIMIT ?
+        ''', (since_day, limit)) as cursor:
+            return await cursor.fetchall()
+
+@timed_query
+async def get_user_spend(user_id):
+    """(orders, spent, last_order_at) пользователя или None, если заказов не было."""
+    async with pool.read() as db:
+        async with db.execute(
+            'SELECT orders, spent, last_order_at FROM user_sales WHERE user_id=?', (user_id,)
+        ) as cursor:
+            return await cursor.fetchone()
+
+@timed_query
+async def get_top_spenders(limit):
+    async with pool.read() as db:
+        async with db.execute(
+            'SELECT user_id, orders, spent FROM user_sales ORDER BY spent DESC LIMIT ?', (limit,)
+        ) as cursor:
+            return await cursor.fetchall()
+
+@timed_query
 async def get_order_items(order_id):
-    async with aiosqlite.connect('bot.db') as db:
+    async with pool.read() as db:
         async with db.execute(
             'SELECT product_id, quantity, price_at_purchase FROM order_items WHERE order_id=?',
             (order_id,)
@@ -227,4 +715,131 @@ async def get_order_items(order_id):
             return [
                 {'product_id': row[0], 'quantity': row[1], 'price_at_purchase': row[2]}
                 for row in await cursor.fetchall()
-            ]
\ No newline at end of file
+            ]
+
+@timed_query
+async def get_category_section(category_id):
+    for cat_id, _, section in await get_categories():
+        if cat_id == category_id:
+            return section
+    return None
+
+async def close_db():
+    # Фоновые чтения не должны пережить пул соединений
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await coalescer.close()
+    await pool.close()
+
+@timed_query
+async def get_pending_deliveries():
+    async with pool.read() as db:
+        async with db.execute("SELECT id, user_id, delivered FROM orders WHERE status='pending'") as cursor:
+            return await cursor.fetchall()
+
+@timed_query
+async def get_order_delivery_items(order_id):
+    async with pool.read() as db:
+        async with db.execute('''
+            SELECT oi.product_id, oi.quantity, p.name, p.asset_url
+            FROM order_items oi LEFT JOIN products p ON p.id = oi.product_id
+            WHERE oi.order_id=? ORDER BY oi.rowid
+        ''', (order_id,)) as cursor:
+            return [
+                {'product_id': row[0], 'quantity': row[1], 'name': row[2], 'asset_url': row[3]}
+                for row in await cursor.fetchall()
+            ]
+
+@timed_query
+async def set_order_delivered(order_id, delivered, done):
+    async with pool.write() as db:
+        await db.execute(
+            'UPDATE orders SET delivered=?, status=? WHERE id=?',
+            (delivered, 'delivered' if done else 'pending', order_id)
+        )
+        await db.commit()
+
+@timed_query
+async def create_broadcast(admin_chat_id, text=None, source_chat_id=None, source_message_id=None):
+    """Создаёт задание рассылки; total — число пользователей на момент создания."""
+    async with pool.write() as db:
+        await db.execute('BEGIN IMMEDIATE')
+        async with db.execute('SELECT COUNT(*) FROM users') as cursor:
+            total = (await cursor.fetchone())[0]
+        async with db.execute('''
+            INSERT INTO broadcast_jobs (admin_chat_id, text, source_chat_id, source_message_id, total, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (admin_chat_id, text, source_chat_id, source_message_id, total, datetime.now().isoformat())) as cursor:
+            job_id = cursor.lastrowid
+        await db.commit()
+    return job_id
+
+_BROADCAST_COLUMNS = (
+    'id', 'admin_chat_id', 'text', 'source_chat_id', 'source_message_id', 'status', 'last_user_id',
+    'total', 'sent', 'failed', 'blocked',
+)
+
+@timed_query
+async def get_broadcast(job_id):
+    async with pool.read() as db:
+        async with db.execute(
+            f"SELECT {', '.join(_BROADCAST_COLUMNS)} FROM broadcast_jobs WHERE id=?", (job_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+    return dict(zip(_BROADCAST_COLUMNS, row)) if row else None
+
+@timed_query
+async def get_running_broadcasts():
+    async with pool.read() as db:
+        async with db.execute("SELECT id, admin_chat_id FROM broadcast_jobs WHERE status='running'") as cursor:
+            return await cursor.fetchall()
+
+@timed_query
+async def get_broadcast_recipients(job_id, after_user_id, limit):
+    # Пользователи идут по возрастанию user_id, так что позиция задания — последний обработанный id.
+    # Получатели прерванной пачки, которым сообщение уже ушло, пропускаются
+    async with pool.read() as db:
+        async with db.execute('''
+            SELECT user_id FROM users u WHERE user_id>? AND NOT EXISTS (
+                SELECT 1 FROM broadcast_recipients r WHERE r.job_id=? AND r.user_id=u.user_id
+            ) ORDER BY user_id LIMIT ?
+        ''', (after_user_id, job_id, limit)) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+@timed_query
+async def record_broadcast_batch(job_id, last_user_id, results):
+    """Сохраняет статусы пачки получателей и сдвигает позицию задания одной транзакцией.
+
+    results — кортежи (user_id, status, error), status: sent, failed или blocked.
+    Заблокировавшие бота пользователи с нулевым балансом удаляются из users.
+    """
+    counts = {status: sum(1 for _, s, _ in results if s == status) for status in ('sent', 'failed', 'blocked')}
+    blocked = [user_id for user_id, status, _ in results if status == 'blocked']
+    async with pool.write() as db:
+        await db.execute('BEGIN IMMEDIATE')
+        await db.executemany(
+            'INSERT OR REPLACE INTO broadcast_recipients (job_id, user_id, status, error) VALUES (?, ?, ?, ?)',
+            [(job_id, user_id, status, error) for user_id, status, error in results]
+        )
+        await db.execute('''
+            UPDATE broadcast_jobs SET last_user_id=?, sent=sent+?, failed=failed+?, blocked=blocked+? WHERE id=?
+        ''', (last_user_id, counts['sent'], counts['failed'], counts['blocked'], job_id))
+        # Пользователь с деньгами на балансе остаётся: он может вернуться в бота
+        for user_id in blocked:
+            if await _balance(db, user_id) == 0:
+                await db.execute('DELETE FROM users WHERE user_id=?', (user_id,))
+        await db.commit()
+
+@timed_query
+async def finish_broadcast(job_id, status):
+    """Переводит задание из running в status; возвращает False, если оно уже завершено."""
+    async with pool.write() as db:
+        async with db.execute(
+            "UPDATE broadcast_jobs SET status=?, finished_at=? WHERE id=? AND status='running'",
+            (status, datetime.now().isoformat(), job_id)
+        ) as cursor:
+            changed = cursor.rowcount == 1
+        await db.commit()
+    return changed
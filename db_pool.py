@@ -0,0 +1,223 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+from metrics import WRITE_BATCH_SIZE, WRITE_COMMIT_SECONDS
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA foreign_keys=ON',
+)
+
+
+class ConnectionPool:
+    """Долгоживущие соединения с SQLite: один писатель и несколько читателей.
+
+    В режиме WAL читатели не блокируют писателя, поэтому чтения раздаются
+    из очереди, а все записи сериализуются через единственное соединение.
+    """
+
+    def __init__(self, path, readers=4):
+        self.path = path
+        self.readers = readers
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+        self._idle = asyncio.Queue()
+        self._connections = []
+
+    @property
+    def is_open(self):
+        return self._writer is not None
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.path)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        self._connections.append(conn)
+        return conn
+
+    async def open(self):
+        async with self._open_lock:
+            if self.is_open:
+                return
+            # Писатель открывается первым, чтобы переключить файл в WAL до читателей
+            writer = await self._connect()
+            for _ in range(self.readers):
+                self._idle.put_nowait(await self._connect())
+            self._writer = writer
+
+    async def close(self):
+        async with self._open_lock:
+            if not self.is_open:
+                return
+            async with self._write_lock:
+                self._writer = None
+                while not self._idle.empty():
+                    self._idle.get_nowait()
+                connections, self._connections = self._connections, []
+                for conn in connections:
+                    await conn.close()
+
+    @asynccontextmanager
+    async def read(self):
+        if not self.is_open:
+            await self.open()
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self):
+        if not self.is_open:
+            await self.open()
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+
+
+class _OperationFailed(Exception):
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+class WriteCoalescer:
+    """Групповая фиксация мелких записей: одна транзакция и один commit на пачку.
+
+    Операция — корутинная функция от соединения писателя, она выполняет
+    запросы и возвращает результат, но сама не вызывает commit. Фоновая задача
+    собирает операции из очереди, пока их не наберётся max_batch или не пройдёт
+    max_delay секунд после первой, и выполняет пачку под писателем пула.
+    Если операция падает, пачка откатывается и выполняется заново, каждая
+    операция в своей точке сохранения: ошибка достаётся только её вызывающему.
+    Поэтому операция может выполниться дважды и не должна менять ничего, кроме базы.
+    """
+
+    def __init__(self, pool, max_batch=64, max_delay=0.003):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._task = None
+        self.batches = 0
+        self.operations = 0
+        self.commit_seconds = 0.0
+
+    async def submit(self, operation):
+        """Ставит операцию в очередь и возвращает её результат после фиксации пачки."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, future))
+        if self._queue.qsize() >= self.max_batch:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self.max_batch - 1:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch):
+        # Операции отменённых вызывающих не выполняются
+        batch = [(operation, future) for operation, future in batch if not future.done()]
+        if not batch:
+            return
+        try:
+            try:
+                outcomes = await self._execute(batch, isolated=False)
+            except _OperationFailed as failed:
+                if len(batch) == 1:
+                    outcomes = [(batch[0][1], None, failed.error)]
+                else:
+                    # Пачка откачена целиком и повторяется с точками сохранения
+                    outcomes = await self._execute(batch, isolated=True)
+        except Exception as e:
+            # Пачка не зафиксирована: ошибку получают все её операции
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    async def _execute(self, batch, isolated):
+        # Без isolated первая же ошибка операции откатывает всю пачку: точка
+        # сохранения на каждую операцию стоит лишних обращений к потоку aiosqlite
+        outcomes = []
+        async with self.pool.write() as db:
+            # Ожидание писателя в задержку фиксации не входит
+            started = time.perf_counter()
+            await db.execute('BEGIN IMMEDIATE')
+            for operation, future in batch:
+                if isolated:
+                    await db.execute('SAVEPOINT coalesced')
+                try:
+                    outcomes.append((future, await operation(db), None))
+                except Exception as e:
+                    if not isolated:
+                        raise _OperationFailed(e) from e
+                    await db.execute('ROLLBACK TO coalesced')
+                    outcomes.append((future, None, e))
+                if isolated:
+                    await db.execute('RELEASE coalesced')
+            await db.commit()
+        elapsed = time.perf_counter() - started
+        WRITE_BATCH_SIZE.observe(len(batch))
+        WRITE_COMMIT_SECONDS.observe(elapsed)
+        self.batches += 1
+        self.operations += len(batch)
+        self.commit_seconds += elapsed
+        return outcomes
+
+    def stats(self):
+        """Число пачек и операций, средний размер пачки и среднее время её фиксации в мс."""
+        return {
+            "batches": self.batches,
+            "operations": self.operations,
+            "mean_batch": self.operations / self.batches if self.batches else 0.0,
+            "mean_commit_ms": self.commit_seconds / self.batches * 1000 if self.batches else 0.0,
+        }
+
+    async def close(self):
+        """Дожидается фиксации принятых операций и останавливает фоновую задачу."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import InputMediaDocument
+
+from config import DELIVERY_RETRY_INTERVAL
+from database import get_pending_deliveries, get_order_delivery_items, set_order_delivered
+from supervisor import owns
+
+MEDIA_GROUP_SIZE = 10
+
+_in_progress = set()
+_background_tasks = set()
+
+
+async def deliver_order(bot: Bot, chat_id, order_id, items, delivered=0):
+    """Выдаёт файлы заказа группами по 10 документов, начиная с позиции delivered.
+
+    Прогресс сохраняется после каждой группы, поэтому прерванную выдачу
+    можно продолжить с того же места.
+    """
+    if order_id in _in_progress:
+        return
+    _in_progress.add(order_id)
+    try:
+        units = [(item['asset_url'], item['name']) for item in items for _ in range(item['quantity'])]
+        position = delivered
+        while position < len(units):
+            batch = units[position:position + MEDIA_GROUP_SIZE]
+            # Ассет, удалённый из каталога до возобновления выдачи, пропускается
+            files = [(file_id, name) for file_id, name in batch if file_id]
+            if len(files) == 1:
+                file_id, name = files[0]
+                await bot.send_document(chat_id, document=file_id, caption=f"Ваш ассет: {name} 🌟")
+            elif files:
+                await bot.send_media_group(chat_id, media=[
+                    InputMediaDocument(media=file_id, caption=f"Ваш ассет: {name} 🌟") for file_id, name in files
+                ])
+            position += len(batch)
+            await set_order_delivered(order_id, position, position >= len(units))
+        if not units:
+            await set_order_delivered(order_id, 0, True)
+    finally:
+        _in_progress.discard(order_id)
+
+
+async def resume_deliveries(bot: Bot):
+    for order_id, user_id, delivered in await get_pending_deliveries():
+        # При нескольких воркерах выдачу продолжает тот, кто обслуживает покупателя
+        if not owns(user_id):
+            continue
+        items = await get_order_delivery_items(order_id)
+        logging.info("Resuming delivery of order %s from item %s", order_id, delivered)
+        try:
+            await deliver_order(bot, user_id, order_id, items, delivered)
+        except TelegramAPIError:
+            logging.exception("Delivery of order %s failed, will retry later", order_id)
+
+
+async def retry_deliveries(bot: Bot, interval):
+    """Продолжает незавершённые выдачи при запуске и затем каждые interval секунд."""
+    while True:
+        try:
+            await resume_deliveries(bot)
+        except Exception:
+            logging.exception("Resuming deliveries failed")
+        await asyncio.sleep(interval)
+
+
+async def schedule_resume_deliveries(bot: Bot):
+    task = asyncio.create_task(retry_deliveries(bot, DELIVERY_RETRY_INTERVAL))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def stop_deliveries():
+    # Прерванная выдача останется в статусе pending и продолжится при следующем запуске
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,26 @@
+from aiogram.filters import BaseFilter
+from aiogram.types import CallbackQuery, TelegramObject, User
+
+from config import ADMIN_ID
+
+
+class AdminFilter(BaseFilter):
+    """Пропускает только апдейты от администратора."""
+
+    async def __call__(self, event: TelegramObject, event_from_user: User | None = None) -> bool:
+        return event_from_user is not None and event_from_user.id == ADMIN_ID
+
+
+class CallbackPrefix(BaseFilter):
+    """Пропускает callback-запросы с префиксом одной из фабрик CallbackData.
+
+    Вешается на роутер целиком: чужой callback отсекается одной проверкой
+    по множеству, без перебора фильтров всех обработчиков роутера.
+    """
+
+    def __init__(self, *factories):
+        # У всех фабрик в callbacks.py разделитель по умолчанию — двоеточие
+        self.prefixes = frozenset(factory.__prefix__ for factory in factories)
+
+    async def __call__(self, callback: CallbackQuery) -> bool:
+        return bool(callback.data) and callback.data.partition(":")[0] in self.prefixes
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Mapping
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import FSM_TTL, FSM_FLUSH_INTERVAL, FSM_FLUSH_BATCH, FSM_CACHE_SIZE
+from metrics import FSM_STORAGE_SECONDS, timed
+
+PURGE_INTERVAL = 60.0
+
+timed_operation = timed(FSM_STORAGE_SECONDS, 'operation')
+
+
+class _Record:
+    __slots__ = ('state', 'data', 'updated_at')
+
+    def __init__(self, state=None, data=None, updated_at=0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_states с отложенной записью.
+
+    Чтения обслуживаются из памяти, база читается только при первом обращении
+    к ключу. Изменения помечают ключ грязным, а фоновая задача раз в
+    flush_interval (или при накоплении flush_batch ключей) записывает их одной
+    транзакцией, так что несколько изменений одного ключа дают одну запись.
+    Состояния, не менявшиеся дольше ttl секунд, считаются пустыми и удаляются.
+    """
+
+    def __init__(self, pool, ttl=FSM_TTL, flush_interval=FSM_FLUSH_INTERVAL, flush_batch=FSM_FLUSH_BATCH,
+                 max_cached=FSM_CACHE_SIZE, coalescer=None):
+        self.pool = pool
+        # С coalescer сброс фиксируется в одной транзакции с другими мелкими записями
+        self.coalescer = coalescer
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_cached = max_cached
+        self._records = OrderedDict()
+        self._dirty = set()
+        # Ключи, чья запись уже отправлена в базу, но ещё не зафиксирована
+        self._in_flight = set()
+        self._flush_now = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._last_purge = time.monotonic()
+
+    @staticmethod
+    def _key(key: StorageKey):
+        return ':'.join(str(part) for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny
+        ))
+
+    def _expired(self, updated_at):
+        return updated_at and time.time() - updated_at > self.ttl
+
+    async def _load(self, key):
+        async with self.pool.read() as db:
+            async with db.execute('SELECT state, data, updated_at FROM fsm_states WHERE key=?', (key,)) as cursor:
+                row = await cursor.fetchone()
+        if row is None or self._expired(row[2]):
+            return _Record()
+        return _Record(row[0], json.loads(row[1]) if row[1] else {}, row[2])
+
+    async def _record(self, key: StorageKey):
+        key = self._key(key)
+        record = self._records.get(key)
+        if record is None:
+            loaded = await self._load(key)
+            # Пока шло чтение, ключ мог быть записан: запись в памяти новее
+            record = self._records.setdefault(key, loaded)
+            self._evict(keep=key)
+        elif self._expired(record.updated_at):
+            record = self._records[key] = _Record()
+            self._mark_dirty(key, record)
+        self._records.move_to_end(key)
+        return key, record
+
+    def _evict(self, keep):
+        excess = len(self._records) - self.max_cached
+        if excess <= 0:
+            return
+        # Грязные записи остаются в памяти до фиксации сброса: иначе чтение
+        # вернуло бы из базы старое состояние
+        victims = []
+        for key in self._records:
+            if key != keep and key not in self._dirty and key not in self._in_flight:
+                victims.append(key)
+                if len(victims) == excess:
+                    break
+        for key in victims:
+            del self._records[key]
+
+    def _mark_dirty(self, key, record):
+        record.updated_at = time.time()
+        self._dirty.add(key)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if len(self._dirty) >= self.flush_batch:
+            self._flush_now.set()
+
+    @timed_operation
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        key, record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key, record)
+
+    @timed_operation
+    async def get_state(self, key: StorageKey) -> str | None:
+        _, record = await self._record(key)
+        return record.state
+
+    @timed_operation
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        key, record = await self._record(key)
+        record.data = data.copy()
+        self._mark_dirty(key, record)
+
+    @timed_operation
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, record = await self._record(key)
+        return record.data.copy()
+
+    @timed_operation
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            keys, self._dirty = self._dirty, set()
+            self._in_flight = keys
+            upserts, deletes = [], []
+            for key in keys:
+                record = self._records[key]
+                if record.state is None and not record.data:
+                    deletes.append((key,))
+                else:
+                    upserts.append((key, record.state, json.dumps(record.data, ensure_ascii=False),
+                                    record.updated_at))
+
+            async def write(db):
+                if upserts:
+                    await db.executemany('''
+                        INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET
+                            state=excluded.state, data=excluded.data, updated_at=excluded.updated_at
+                    ''', upserts)
+                if deletes:
+                    await db.executemany('DELETE FROM fsm_states WHERE key=?', deletes)
+
+            try:
+                if self.coalescer is not None:
+                    await self.coalescer.submit(write)
+                else:
+                    async with self.pool.write() as db:
+                        await write(db)
+                        await db.commit()
+            except BaseException:
+                # Ключи вернутся в следующий сброс
+                self._dirty |= keys
+                raise
+            finally:
+                self._in_flight = set()
+
+    @timed_operation
+    async def purge_expired(self):
+        async with self.pool.write() as db:
+            await db.execute('DELETE FROM fsm_states WHERE updated_at < ?', (time.time() - self.ttl,))
+            await db.commit()
+        self._last_purge = time.monotonic()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+                    await self.purge_expired()
+            except Exception:
+                logging.exception("FSM storage flush failed")
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
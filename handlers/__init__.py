@@ -0,0 +1,41 @@
+"""Обработчики бота, по роутеру на раздел: каталог, корзина, оформление заказа, баланс и администрирование."""
+import importlib
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+from config import ADMIN_ID
+
+
+class LazyRouter(Router):
+    """Роутер, модуль которого импортируется при первом апдейте от одного из user_ids.
+
+    Апдейты остальных пользователей отклоняются сразу, без проверки фильтров
+    обработчиков модуля.
+    """
+
+    def __init__(self, module, user_ids, name=None):
+        super().__init__(name=name or module)
+        self.module = module
+        self.user_ids = frozenset(user_ids)
+
+    async def propagate_event(self, update_type, event, **kwargs):
+        user = kwargs.get("event_from_user")
+        if user is None or user.id not in self.user_ids:
+            return UNHANDLED
+        if not self.sub_routers:
+            self.include_router(importlib.import_module(self.module).router)
+        return await super().propagate_event(update_type, event, **kwargs)
+
+
+def create_router():
+    from handlers import common, catalog, cart, checkout, balance
+
+    router = Router(name="handlers")
+    # Администратор проверяется первым: его команды не должны перехватываться
+    # состояниями покупателя, например просмотром каталога
+    router.include_routers(
+        LazyRouter("handlers.admin", [ADMIN_ID]),
+        common.router, catalog.router, cart.router, checkout.router, balance.router,
+    )
+    return router
@@ -0,0 +1,432 @@
+"""Команды администратора. Модуль загружается при первом апдейте от администратора."""
+from datetime import date, timedelta
+from functools import partial
+
+from aiogram import Bot, Router, F, types
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineKeyboardButton
+
+from broadcast import start_broadcast, cancel_broadcast
+from callbacks import NewCategoryCallback, AdminCategoryCallback, AdminPageCallback, DeleteProductCallback, \
+    BroadcastCallback
+from catalog_import import ManifestError, MAX_MANIFEST_SIZE, parse_manifest, validate_manifest
+from config import LIST_PAGE_SIZE
+from database import get_categories_page, get_products_page, add_category, add_product, delete_category, \
+    delete_product, get_user_balance, update_user_balance, get_balance_transactions, get_category_section, \
+    import_products, rebuild_sales_aggregates, get_sales_summary, get_category_sales, get_best_sellers, \
+    get_user_spend, get_top_spenders
+from filters import AdminFilter, CallbackPrefix
+from keyboards import category_section_menu, broadcast_confirm_menu
+from pagination import load_page, page_keyboard, turn_page
+from states import AddProductStates, AddCategoryStates, AddBalanceStates, ImportCatalogStates, BroadcastStates
+
+router = Router(name="admin")
+router.message.filter(AdminFilter())
+router.callback_query.filter(AdminFilter(), CallbackPrefix(NewCategoryCallback, AdminCategoryCallback,
+                                                           AdminPageCallback, DeleteProductCallback,
+                                                           BroadcastCallback))
+
+
+# Списки категорий и ассетов листаются страницами по LIST_PAGE_SIZE строк
+async def categories_keyboard(action, cursor=0, forward=True):
+    """Страница всех категорий с кнопками AdminCategoryCallback(action) или None, если категорий нет."""
+    page = await load_page(partial(get_categories_page, None), cursor, forward, LIST_PAGE_SIZE)
+    if not page.rows:
+        return None
+    rows = [
+        [InlineKeyboardButton(text=f"{name} ({section or 'unknown'})",
+                              callback_data=AdminCategoryCallback(action=action, category_id=category_id).pack())]
+        for category_id, name, section in page.rows
+    ]
+    return page_keyboard(rows, page, lambda cursor, forward: AdminPageCallback(action=action, cursor=cursor,
+                                                                               forward=forward))
+
+
+async def products_keyboard(category_id, cursor=0, forward=True):
+    """Страница ассетов категории с кнопками удаления или None, если ассетов нет."""
+    page = await load_page(partial(get_products_page, category_id), cursor, forward, LIST_PAGE_SIZE)
+    if not page.rows:
+        return None
+    rows = [[InlineKeyboardButton(text=product[2], callback_data=DeleteProductCallback(product_id=product[0]).pack())]
+            for product in page.rows]
+    return page_keyboard(rows, page, lambda cursor, forward: AdminPageCallback(
+        action="products", category_id=category_id, cursor=cursor, forward=forward))
+
+
+@router.callback_query(AdminPageCallback.filter())
+async def turn_admin_page(callback: types.CallbackQuery, callback_data: AdminPageCallback):
+    if callback_data.action == "products":
+        keyboard = await products_keyboard(callback_data.category_id, callback_data.cursor, callback_data.forward)
+    else:
+        keyboard = await categories_keyboard(callback_data.action, callback_data.cursor, callback_data.forward)
+    if keyboard is None:
+        await callback.answer("Список пуст. 📭")
+        return
+    await turn_page(callback.message, keyboard)
+    await callback.answer()
+
+
+# Начало процесса пополнения баланса администратором
+@router.message(Command("add_balance"))
+async def start_add_balance(message: types.Message, state: FSMContext):
+    await state.clear()
+    await state.set_state(AddBalanceStates.user_id)
+    await message.answer("Введите ID пользователя для пополнения баланса: 🆔")
+
+
+# Обработка ID пользователя
+@router.message(AddBalanceStates.user_id)
+async def process_user_id(message: types.Message, state: FSMContext):
+    try:
+        user_id = int(message.text)
+        await state.update_data(user_id=user_id)
+        await state.set_state(AddBalanceStates.balance_amount)
+        await message.answer("Введите сумму для пополнения: 💰")
+    except ValueError:
+        await message.answer("Пожалуйста, введите корректный ID пользователя. ⚠️")
+
+
+# Обработка суммы пополнения администратором
+@router.message(AddBalanceStates.balance_amount)
+async def process_balance_amount(message: types.Message, state: FSMContext, bot: Bot):
+    try:
+        amount = float(message.text)
+        if amount <= 0:
+            await message.answer("Сумма должна быть положительной. ⚠️")
+            return
+        data = await state.get_data()
+        user_id = data['user_id']
+        success = await update_user_balance(user_id, amount, f"admin_top_up:{message.chat.id}:{message.message_id}",
+                                            kind='admin_top_up')
+        if success:
+            await message.answer(f"Баланс пользователя {user_id} пополнен на {amount:.2f} руб. ✅")
+            await bot.send_message(user_id,
+                                   f"Ваш баланс пополнен на {amount:.2f} руб. 💰 Новый баланс: {await get_user_balance(user_id):.2f} руб.")
+        else:
+            await message.answer("Ошибка при пополнении баланса. ⚠️")
+        await state.clear()
+    except ValueError:
+        await message.answer("Введите корректное число. ⚠️")
+
+
+# Журнал баланса пользователя: последние операции и текущий баланс
+@router.message(Command("ledger"))
+async def ledger_report(message: types.Message, command: CommandObject):
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer("Укажите ID пользователя: /ledger 123456")
+        return
+    user_id = int(command.args)
+    transactions = await get_balance_transactions(user_id, 20)
+    if not transactions:
+        await message.answer(f"У пользователя {user_id} нет операций с балансом. 📭")
+        return
+    text = f"<b>📒 Баланс {user_id}: {await get_user_balance(user_id):.2f} руб.</b>\n" + "".join(
+        f"{created_at[:16].replace('T', ' ')} {amount / 100:+.2f} руб. — {kind}"
+        f"{f' (заказ #{order_id})' if order_id else ''}\n"
+        for _, amount, kind, order_id, created_at in transactions)
+    await message.answer(text)
+
+
+@router.message(Command("add_category"))
+async def start_add_category(message: types.Message, state: FSMContext):
+    await state.set_state(AddCategoryStates.name)
+    await message.answer("Введите название категории: 📂")
+
+
+@router.message(AddCategoryStates.name)
+async def process_category_name(message: types.Message, state: FSMContext):
+    await state.update_data(name=message.text)
+    await state.set_state(AddCategoryStates.section)
+    await message.answer("Выберите тип категории:", reply_markup=category_section_menu)
+
+
+@router.callback_query(NewCategoryCallback.filter())
+async def process_category_section(callback: types.CallbackQuery, callback_data: NewCategoryCallback,
+                                   state: FSMContext):
+    section = callback_data.section
+    data = await state.get_data()
+    await add_category(data["name"], section)
+    await callback.message.answer(f"Категория '{data['name']}' ({section}) добавлена. ✅")
+    await state.clear()
+    await callback.answer()
+
+
+@router.message(Command("add_product"))
+async def start_add_product(message: types.Message, state: FSMContext):
+    keyboard = await categories_keyboard("add_product")
+    if keyboard is None:
+        await message.answer("Сначала добавьте категории с помощью /add_category. ⚠️")
+        return
+    await state.set_state(AddProductStates.category)
+    await message.answer("Выберите категорию: 📋", reply_markup=keyboard)
+
+
+@router.callback_query(AdminCategoryCallback.filter(F.action == "add_product"))
+async def select_category(callback: types.CallbackQuery, callback_data: AdminCategoryCallback, state: FSMContext):
+    await state.update_data(category_id=callback_data.category_id)
+    await state.set_state(AddProductStates.name)
+    await callback.message.answer("Введите название ассета:", reply_markup=types.ReplyKeyboardRemove())
+    await callback.answer()
+
+
+@router.message(AddProductStates.name)
+async def process_product_name(message: types.Message, state: FSMContext):
+    await state.update_data(name=message.text)
+    await state.set_state(AddProductStates.description)
+    await message.answer("Введите описание ассета: 📝")
+
+
+@router.message(AddProductStates.description)
+async def process_product_description(message: types.Message, state: FSMContext):
+    await state.update_data(description=message.text)
+    data = await state.get_data()
+    category_id = data['category_id']
+
+    if await get_category_section(category_id) == 'free':
+        await state.update_data(price=0.0, is_free=1)
+        await state.set_state(AddProductStates.photo)
+        await message.answer("Выберите фото ассета: 📸")
+    else:
+        await state.set_state(AddProductStates.price)
+        await message.answer("Введите цену ассета: 💰")
+
+
+@router.message(AddProductStates.price)
+async def process_product_price(message: types.Message, state: FSMContext):
+    try:
+        price = float(message.text)
+        if price < 0:
+            await message.answer("Цена не может быть отрицательной. ⚠️")
+            return
+        await state.update_data(price=price)
+        is_free = 1 if price == 0 else 0
+        await state.update_data(is_free=is_free)
+        await state.set_state(AddProductStates.photo)
+        await message.answer("Выберите фото ассета: 📸")
+    except ValueError:
+        await message.answer("Введите корректное число. ⚠️")
+
+
+@router.message(AddProductStates.photo, F.photo)
+async def process_product_photo(message: types.Message, state: FSMContext):
+    photo = message.photo[-1]
+    file_id = photo.file_id
+    await state.update_data(photo=file_id)
+    await state.set_state(AddProductStates.asset_file)
+    await message.answer("Загрузите файл ассета (.fbx, .jpg, .obj, .blend): 📤")
+
+
+@router.message(AddProductStates.asset_file, F.document)
+async def process_asset_file(message: types.Message, state: FSMContext):
+    file_name = message.document.file_name
+    if file_name.lower().endswith(('.fbx', '.jpg', '.obj', '.blend')):
+        file_id = message.document.file_id
+        data = await state.get_data()
+        await add_product(data['category_id'], data['name'],
+                          data['description'], data['price'],
+                          data['photo'], file_id,
+                          data['is_free'])
+        await message.answer("Ассет успешно добавлен! 😄🎉")
+        await state.clear()
+    else:
+        await message.answer("Неверный формат файла. Загрузите файл в формате .fbx, .jpg, .obj или .blend.")
+
+
+@router.message(AddProductStates.asset_file)
+async def invalid_asset_file(message: types.Message, state: FSMContext):
+    await message.answer("Пожалуйста, загрузите файл в формате .fbx, .jpg, .obj или .blend.")
+
+
+# Массовый импорт ассетов из CSV или JSON манифеста с file_id фото и файлов
+@router.message(Command("import"))
+async def start_import(message: types.Message, state: FSMContext, bot: Bot):
+    if message.document:
+        await import_manifest(message, state, bot)
+        return
+    await state.set_state(ImportCatalogStates.manifest)
+    await message.answer(
+        "Отправьте манифест .csv или .json 📄\n"
+        "Колонки: category, section (free/paid), name, description, price, photo, asset. "
+        "photo и asset — file_id уже загруженных в Telegram фото и файлов."
+    )
+
+
+@router.message(ImportCatalogStates.manifest, F.document)
+async def import_manifest(message: types.Message, state: FSMContext, bot: Bot):
+    document = message.document
+    if document.file_size and document.file_size > MAX_MANIFEST_SIZE:
+        await message.answer(f"Манифест больше {MAX_MANIFEST_SIZE // 1024 // 1024} МБ. Разбейте его на части. ⚠️")
+        return
+    content = (await bot.download(document)).read()
+    try:
+        entries = parse_manifest(document.file_name or "", content)
+    except ManifestError as e:
+        await message.answer(f"Не удалось прочитать манифест: {e} ⚠️")
+        return
+    await state.clear()
+    rows, errors = validate_manifest(entries)
+    imported, created = await import_products(rows) if rows else (0, 0)
+    text = f"Импорт завершён: добавлено ассетов — {imported}, новых категорий — {created}. ✅"
+    if errors:
+        text += f"\n\nПропущено строк — {len(errors)}:\n" + "\n".join(
+            f"строка {number}: {error}" for number, error in errors[:30])
+        if len(errors) > 30:
+            text += f"\n… и ещё {len(errors) - 30}"
+    await message.answer(text)
+
+
+@router.message(ImportCatalogStates.manifest)
+async def invalid_manifest(message: types.Message, state: FSMContext):
+    await message.answer("Пришлите манифест файлом .csv или .json. 📄")
+
+
+@router.message(Command("delete_category"))
+async def start_delete_category(message: types.Message):
+    keyboard = await categories_keyboard("delete")
+    if keyboard is None:
+        await message.answer("Категорий нет для удаления. 📭")
+        return
+    await message.answer("Выберите категорию для удаления: ❌", reply_markup=keyboard)
+
+
+@router.callback_query(AdminCategoryCallback.filter(F.action == "delete"))
+async def confirm_delete_category(callback: types.CallbackQuery, callback_data: AdminCategoryCallback):
+    await delete_category(callback_data.category_id)
+    await callback.message.answer("Категория и все её ассеты удалены. ✅")
+    await callback.answer()
+
+
+@router.message(Command("delete_product"))
+async def start_delete_product(message: types.Message):
+    keyboard = await categories_keyboard("delete_product")
+    if keyboard is None:
+        await message.answer("Нет категорий. Добавьте их сначала. ⚠️")
+        return
+    await message.answer("Выберите категорию ассета: 🗂️", reply_markup=keyboard)
+
+
+@router.callback_query(AdminCategoryCallback.filter(F.action == "delete_product"))
+async def show_products_for_deletion(callback: types.CallbackQuery, callback_data: AdminCategoryCallback):
+    keyboard = await products_keyboard(callback_data.category_id)
+    if keyboard is None:
+        await callback.message.answer("В этой категории нет ассетов. 📭")
+        return
+    await callback.message.answer("Выберите ассет для удаления: ❌", reply_markup=keyboard)
+    await callback.answer()
+
+
+@router.callback_query(DeleteProductCallback.filter())
+async def confirm_delete_product(callback: types.CallbackQuery, callback_data: DeleteProductCallback):
+    await delete_product(callback_data.product_id)
+    await callback.message.answer("Ассет удалён. ✅")
+    await callback.answer()
+
+# Отчёты о продажах для администратора; период — число дней, считая сегодняшний
+def _report_period(args, default=7):
+    days = int(args) if args and args.isdigit() and int(args) > 0 else default
+    return days, (date.today() - timedelta(days=days - 1)).isoformat()
+
+
+@router.message(Command("revenue"))
+async def revenue_report(message: types.Message, command: CommandObject):
+    days, since = _report_period(command.args)
+    (orders, units, revenue), daily = await get_sales_summary(since)
+    text = (f"<b>📊 Выручка за {days} дн.</b>\n"
+            f"Заказов: {orders}, ассетов: {units}\nИтого: {revenue:.2f} руб. 💰\n")
+    if daily:
+        text += "\n<b>По дням:</b>\n" + "".join(
+            f"{day}: {day_revenue:.2f} руб. ({day_orders} зак.)\n" for day, day_orders, _, day_revenue in daily[-14:])
+    categories = await get_category_sales(since)
+    if categories:
+        text += "\n<b>По категориям:</b>\n" + "".join(
+            f"{name or f'#{category_id}'}: {cat_revenue:.2f} руб. ({cat_units} шт.)\n"
+            for category_id, name, cat_units, cat_revenue in categories[:10])
+    await message.answer(text)
+
+
+@router.message(Command("best_sellers"))
+async def best_sellers_report(message: types.Message, command: CommandObject):
+    days, since = _report_period(command.args, default=30)
+    products = await get_best_sellers(since, 10)
+    if not products:
+        await message.answer(f"За {days} дн. продаж не было. 📭")
+        return
+    text = f"<b>🏆 Лидеры продаж за {days} дн.</b>\n" + "".join(
+        f"{place}. {name or f'#{product_id} (удалён)'} — {units} шт., {revenue:.2f} руб.\n"
+        for place, (product_id, name, units, revenue) in enumerate(products, start=1))
+    await message.answer(text)
+
+
+@router.message(Command("user_spend"))
+async def user_spend_report(message: types.Message, command: CommandObject):
+    if command.args and command.args.strip().isdigit():
+        user_id = int(command.args)
+        spend = await get_user_spend(user_id)
+        if spend is None:
+            await message.answer(f"У пользователя {user_id} нет заказов. 📭")
+            return
+        orders, spent, last_order_at = spend
+        await message.answer(f"Пользователь {user_id}: {orders} зак. на {spent:.2f} руб. 💰\n"
+                             f"Последний заказ: {last_order_at[:16].replace('T', ' ')}")
+        return
+    spenders = await get_top_spenders(10)
+    if not spenders:
+        await message.answer("Заказов пока нет. 📭")
+        return
+    await message.answer("<b>💳 Больше всех потратили</b>\n" + "".join(
+        f"{user_id}: {spent:.2f} руб. ({orders} зак.)\n" for user_id, orders, spent in spenders))
+
+
+@router.message(Command("rebuild_sales"))
+async def rebuild_sales(message: types.Message):
+    await rebuild_sales_aggregates()
+    await message.answer("Статистика продаж пересчитана по всей истории заказов. ✅")
+
+
+# Рассылка всем пользователям: текст команды или копия сообщения, на которое ответил администратор
+@router.message(Command("broadcast"))
+async def start_broadcast_command(message: types.Message, command: CommandObject, state: FSMContext):
+    source = message.reply_to_message
+    if source:
+        await state.update_data(broadcast_source=[source.chat.id, source.message_id], broadcast_text=None)
+        preview = "Сообщение, на которое вы ответили, будет скопировано всем пользователям."
+    elif command.args:
+        await state.update_data(broadcast_source=None, broadcast_text=command.args)
+        preview = f"Текст рассылки:\n\n{command.args}"
+    else:
+        await message.answer("Напишите текст после команды (/broadcast Привет!) "
+                             "или ответьте командой на сообщение, которое нужно разослать. 📣")
+        return
+    await state.set_state(BroadcastStates.confirm)
+    await message.answer(preview, reply_markup=broadcast_confirm_menu)
+
+
+@router.callback_query(BroadcastStates.confirm, BroadcastCallback.filter(F.confirm))
+async def confirm_broadcast(callback: types.CallbackQuery, state: FSMContext, bot: Bot):
+    data = await state.get_data()
+    await state.clear()
+    source_chat_id, source_message_id = data.get("broadcast_source") or (None, None)
+    job_id = await start_broadcast(bot, callback.message.chat.id, data.get("broadcast_text"),
+                                   source_chat_id, source_message_id)
+    await callback.message.edit_text(f"Рассылка #{job_id} запущена. Прогресс будет в отдельном сообщении. 📣\n"
+                                     f"Остановить: /broadcast_cancel {job_id}")
+    await callback.answer()
+
+
+@router.callback_query(BroadcastStates.confirm, BroadcastCallback.filter(~F.confirm))
+async def discard_broadcast(callback: types.CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.edit_text("Рассылка отменена. ❌")
+    await callback.answer()
+
+
+@router.message(Command("broadcast_cancel"))
+async def stop_broadcast_command(message: types.Message, command: CommandObject):
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer("Укажите номер рассылки: /broadcast_cancel 1")
+        return
+    if await cancel_broadcast(int(command.args)):
+        await message.answer(f"Рассылка #{command.args.strip()} остановится после текущей пачки. ⛔")
+    else:
+        await message.answer("Такой активной рассылки нет. 📭")
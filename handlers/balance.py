@@ -0,0 +1,107 @@
+from aiogram import Router, F, types
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from callbacks import BalanceCallback, MenuCallback
+from database import get_user_balance, update_user_balance
+from filters import CallbackPrefix
+from keyboards import balance_menu, top_up_menu
+from payments import yookassa
+from states import UserAddBalanceStates
+
+router = Router(name="balance")
+router.callback_query.filter(CallbackPrefix(BalanceCallback))
+
+
+# Показать баланс
+@router.callback_query(BalanceCallback.filter(F.action == "show"))
+async def show_balance(callback: types.CallbackQuery):
+    balance = await get_user_balance(callback.from_user.id)
+    await callback.message.edit_text(f"💸 Выберите способ пополнения\n20:53\n\n💰 Ваш баланс: {balance:.2f} руб.",
+                                     reply_markup=balance_menu)
+    await callback.answer()
+
+
+# Начало процесса пополнения баланса
+@router.callback_query(BalanceCallback.filter(F.action == "top_up"))
+async def start_top_up_balance(callback: types.CallbackQuery, state: FSMContext):
+    await callback.message.edit_text("Выберите способ пополнения:", reply_markup=top_up_menu)
+    await callback.answer()
+
+
+# Не зарегистрирован: ручной ввод зачислял бы сумму без оплаты
+async def start_manual_top_up(callback: types.CallbackQuery, state: FSMContext):
+    await state.set_state(UserAddBalanceStates.amount)
+    await callback.message.answer("Введите сумму для пополнения: 💰")
+    await callback.answer()
+
+
+# Обработка выбора оплаты через Юкассу и СБП
+@router.callback_query(BalanceCallback.filter(F.action == "sbp"))
+async def start_yookassa_sbp(callback: types.CallbackQuery, state: FSMContext):
+    await state.set_state(UserAddBalanceStates.amount)
+    await callback.message.answer("Введите сумму для пополнения через СБП (Юкасса): 💸")
+    await state.update_data(payment_method="yookassa_sbp")
+    await callback.answer()
+
+
+# Обработка суммы пополнения
+@router.message(UserAddBalanceStates.amount)
+async def process_top_up_amount(message: types.Message, state: FSMContext):
+    try:
+        amount = float(message.text)
+        if amount <= 0:
+            await message.answer("Сумма должна быть положительной. ⚠️")
+            return
+        data = await state.get_data()
+        payment_method = data.get("payment_method", "manual")
+        user_id = message.from_user.id
+
+        if payment_method == "yookassa_sbp":
+            await state.update_data(amount=amount)
+            await state.set_state(UserAddBalanceStates.yookassa_payment)
+            payment_url = await create_yookassa_payment(user_id, amount)
+            if payment_url:
+                keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="Оплатить через СБП", url=payment_url)],
+                    [InlineKeyboardButton(text="⬅️ Вернуться", callback_data=MenuCallback(target="main").pack())]
+                ])
+                await message.answer(f"Перейдите по ссылке для оплаты {amount:.2f} руб. через СБП:\n{payment_url}",
+                                     reply_markup=keyboard)
+            else:
+                await message.answer("Ошибка при создании платежа. Попробуйте снова. ⚠️")
+                await state.clear()
+        else:
+            success = await update_user_balance(user_id, amount, f"top_up:{message.chat.id}:{message.message_id}",
+                                                kind='top_up')
+            if success:
+                new_balance = await get_user_balance(user_id)
+                await message.answer(
+                    f"Баланс успешно пополнен на {amount:.2f} руб. ✅\nНовый баланс: {new_balance:.2f} руб. 💰")
+            else:
+                await message.answer("Ошибка при пополнении баланса. ⚠️")
+            await state.clear()
+    except ValueError:
+        await message.answer("Введите корректное число. ⚠️")
+
+
+# Создание платежа через Юкассу
+async def create_yookassa_payment(user_id, amount):
+    return await yookassa.create_payment(user_id, amount)
+
+
+# Обработка возврата после оплаты через Юкассу
+async def handle_yookassa_return(callback: types.CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    amount = data.get("amount")
+    user_id = callback.from_user.id
+    success = True  # Замените на реальную проверку статуса платежа
+    if success:
+        await update_user_balance(user_id, amount, kind='yookassa')
+        new_balance = await get_user_balance(user_id)
+        await callback.message.answer(
+            f"Баланс успешно пополнен на {amount:.2f} руб. ✅\nНовый баланс: {new_balance:.2f} руб. 💰")
+    else:
+        await callback.message.answer("Ошибка при обработке оплаты. Попробуйте снова. ⚠️")
+    await state.clear()
+    await callback.answer()
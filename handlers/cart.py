@@ -0,0 +1,45 @@
+from aiogram import Router, F, types
+
+from callbacks import AssetCallback, CartCallback
+from database import add_to_cart, get_cart, clear_cart, get_user_balance
+from filters import CallbackPrefix
+from keyboards import main_menu, cart_menu
+
+router = Router(name="cart")
+router.callback_query.filter(CallbackPrefix(AssetCallback, CartCallback))
+
+
+# Добавление продукта в корзину (ограничение до 1 копии)
+@router.callback_query(AssetCallback.filter(F.action == "cart"))
+async def add_to_cart_handler(callback: types.CallbackQuery, callback_data: AssetCallback):
+    # Повторное добавление того же ассета ничего не меняет в корзине
+    added = await add_to_cart(callback.from_user.id, callback_data.product_id, quantity=1, once=True)
+    if added is None:
+        await callback.answer("Этот ассет больше недоступен. 😔", show_alert=True)
+    elif not added:
+        await callback.answer("Этот ассет уже в корзине! Вы можете добавить только 1 копию. ✅", show_alert=True)
+    else:
+        await callback.answer("Ассет добавлен в корзину! ✅")
+        await callback.message.edit_text("Ассет добавлен в корзину. Что дальше?", reply_markup=main_menu)
+
+
+@router.callback_query(CartCallback.filter(F.action == "show"))
+async def show_cart(callback: types.CallbackQuery):
+    user_id = callback.from_user.id
+    cart_items, total = await get_cart(user_id)
+    if not cart_items:
+        await callback.message.answer("Ваша корзина пуста. 🛒")
+        return
+    text = "Ваша корзина: 🛍️\n"
+    for _, name, price, quantity in cart_items:
+        text += f"{name} x {quantity} - {price * quantity:.2f} руб. 💸\n"
+    text += f"Итого: {total:.2f} руб. 💰\nВаш баланс: {await get_user_balance(user_id):.2f} руб. 💳"
+    await callback.message.answer(text, reply_markup=cart_menu)
+    await callback.answer()
+
+
+@router.callback_query(CartCallback.filter(F.action == "clear"))
+async def clear_cart_handler(callback: types.CallbackQuery):
+    await clear_cart(callback.from_user.id)
+    await callback.message.answer("Корзина очищена. 🧹")
+    await callback.answer()
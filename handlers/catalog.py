@@ -0,0 +1,188 @@
+from functools import partial
+
+from aiogram import Bot, Router, F, types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, InlineQueryResultCachedPhoto
+
+from callbacks import SectionCallback, CategoryCallback, CarouselCallback, AssetCallback, SearchCallback
+from config import SEARCH_PAGE_SIZE, INLINE_PAGE_SIZE, LIST_PAGE_SIZE, GRID_PAGE_SIZE
+from database import get_categories_page, get_products_page, get_product, get_next_product, get_prev_product, \
+    prefetch_neighbours, search_products
+from filters import CallbackPrefix
+from keyboards import product_cards, render_product_card, search_results_keyboard, section_categories_keyboard, \
+    product_grid
+from pagination import load_page, send_grid, turn_page
+from states import CatalogStates
+
+router = Router(name="catalog")
+router.callback_query.filter(CallbackPrefix(SectionCallback, CategoryCallback, CarouselCallback, SearchCallback,
+                                            AssetCallback))
+
+
+# Показать категории раздела; длинный список листается в том же сообщении
+@router.callback_query(SectionCallback.filter())
+async def show_section_categories(callback: types.CallbackQuery, callback_data: SectionCallback):
+    section = callback_data.section
+    page = await load_page(partial(get_categories_page, section), callback_data.cursor, callback_data.forward,
+                           LIST_PAGE_SIZE)
+    if not page.rows:
+        await callback.message.answer("Нет категорий в этом разделе.")
+        return
+    keyboard = section_categories_keyboard(section, page)
+    if callback_data.cursor:
+        await turn_page(callback.message, keyboard)
+    else:
+        await callback.message.answer("Выберите категорию:", reply_markup=keyboard)
+    await callback.answer()
+
+
+# Сетка ассетов категории: до GRID_PAGE_SIZE миниатюр одной медиагруппой и номерная клавиатура
+@router.callback_query(CategoryCallback.filter())
+async def show_products(callback: types.CallbackQuery, callback_data: CategoryCallback):
+    category_id = callback_data.category_id
+    page = await load_page(partial(get_products_page, category_id), callback_data.cursor, callback_data.forward,
+                           GRID_PAGE_SIZE)
+    if not page.rows:
+        await callback.message.answer("В этой категории нет ассетов. 😔")
+        return
+    await send_grid(callback.message, *product_grid(category_id, page))
+    await callback.answer()
+
+
+async def show_product(message: types.Message, state: FSMContext, edit=False):
+    data = await state.get_data()
+    product_id = data['product_id']
+    product = await get_product(product_id)
+    if not product:
+        await message.answer("Этот ассет больше недоступен. Нажмите «Вперед» или вернитесь к категориям. 🔄")
+        return
+    text, keyboard = product_cards.get(product)
+    if edit:
+        # Листание меняет карточку на месте; новое сообщение — только если её нельзя отредактировать
+        try:
+            await message.edit_media(InputMediaPhoto(media=product[5], caption=text), reply_markup=keyboard)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                await message.answer_photo(photo=product[5], caption=text, reply_markup=keyboard)
+    else:
+        await message.answer_photo(photo=product[5], caption=text, reply_markup=keyboard)
+    prefetch_neighbours(data['category_id'], product_id)
+
+
+@router.callback_query(CarouselCallback.filter())
+async def swipe_product(callback: types.CallbackQuery, callback_data: CarouselCallback, state: FSMContext):
+    data = await state.get_data()
+    if 'product_id' not in data:
+        await callback.answer("Откройте категорию заново. 📋")
+        return
+    if callback_data.forward:
+        product = await get_next_product(data['category_id'], data['product_id'])
+    else:
+        product = await get_prev_product(data['category_id'], data['product_id'])
+    if product:
+        await state.update_data(product_id=product[0])
+        await show_product(callback.message, state, edit=True)
+    else:
+        await callback.answer("Больше ассетов нет. 🛑" if callback_data.forward else "Это первый ассет. ⏮️")
+    await callback.answer()
+
+
+async def open_product(message: types.Message, state: FSMContext, product_id):
+    """Открывает карусель категории на указанном ассете."""
+    product = await get_product(product_id)
+    if not product:
+        return False
+    await state.update_data(category_id=product[1], product_id=product_id)
+    await state.set_state(CatalogStates.browsing_category)
+    await show_product(message, state)
+    return True
+
+
+@router.callback_query(AssetCallback.filter(F.action == "open"))
+async def open_grid_product(callback: types.CallbackQuery, callback_data: AssetCallback, state: FSMContext):
+    if not await open_product(callback.message, state, callback_data.product_id):
+        await callback.answer("Этот ассет больше недоступен. 😔", show_alert=True)
+        return
+    await callback.answer()
+
+
+@router.callback_query(AssetCallback.filter(F.action == "get"))
+async def send_asset_url(callback: types.CallbackQuery, callback_data: AssetCallback):
+    product = await get_product(callback_data.product_id)
+    if product is None:
+        await callback.answer("Этот ассет больше недоступен. 😔", show_alert=True)
+        return
+    if product[4] == 0:
+        await callback.message.answer_document(document=product[6], caption="Вот ваш бесплатный ассет 🌟")
+    else:
+        await callback.message.answer("Этот ассет платный. Пожалуйста, добавьте его в корзину. 🛒")
+    await callback.answer()
+
+
+# Поиск ассетов по названию и описанию
+@router.message(Command("search"))
+async def search_command(message: types.Message, command: CommandObject, state: FSMContext):
+    if not command.args:
+        await message.answer("Введите запрос после команды, например: /search стол 🔍")
+        return
+    await state.update_data(search_query=command.args)
+    await send_search_page(message, command.args, 0)
+
+
+async def send_search_page(message: types.Message, query, offset, edit=False):
+    # Лишняя строка показывает, есть ли следующая страница, без COUNT(*)
+    products = await search_products(query, SEARCH_PAGE_SIZE + 1, offset)
+    if not products and offset == 0:
+        await message.answer("По вашему запросу ничего не найдено. 😔")
+        return
+    has_more = len(products) > SEARCH_PAGE_SIZE
+    text = f"Результаты поиска «{query}» 🔍"
+    keyboard = search_results_keyboard(products[:SEARCH_PAGE_SIZE], offset, SEARCH_PAGE_SIZE, has_more)
+    if edit:
+        await message.edit_text(text, reply_markup=keyboard)
+    else:
+        await message.answer(text, reply_markup=keyboard)
+
+
+@router.callback_query(SearchCallback.filter(F.action == "page"))
+async def search_page(callback: types.CallbackQuery, callback_data: SearchCallback, state: FSMContext):
+    query = (await state.get_data()).get("search_query")
+    if not query:
+        await callback.answer("Повторите поиск командой /search. 🔍")
+        return
+    await send_search_page(callback.message, query, callback_data.value, edit=True)
+    await callback.answer()
+
+
+@router.callback_query(SearchCallback.filter(F.action == "open"))
+async def open_search_result(callback: types.CallbackQuery, callback_data: SearchCallback, state: FSMContext):
+    if not await open_product(callback.message, state, callback_data.value):
+        await callback.answer("Этот ассет больше недоступен. 😔", show_alert=True)
+        return
+    await callback.answer()
+
+
+@router.inline_query()
+async def inline_search(inline_query: types.InlineQuery, bot: Bot):
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    products = await search_products(inline_query.query, INLINE_PAGE_SIZE + 1, offset)
+    has_more = len(products) > INLINE_PAGE_SIZE
+    username = (await bot.me()).username
+    results = []
+    for product in products[:INLINE_PAGE_SIZE]:
+        text, _ = render_product_card(product)
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+            text="Открыть в боте 🛍️", url=f"https://t.me/{username}?start=product_{product[0]}")]])
+        results.append(InlineQueryResultCachedPhoto(
+            id=str(product[0]), photo_file_id=product[5], title=product[2], description=product[3],
+            caption=text, reply_markup=keyboard
+        ))
+    await inline_query.answer(results, cache_time=60, next_offset=str(offset + INLINE_PAGE_SIZE) if has_more else "")
+
+
+# Любое сообщение во время просмотра категории снова показывает текущую карточку
+@router.message(CatalogStates.browsing_category)
+async def repeat_product(message: types.Message, state: FSMContext):
+    await show_product(message, state)
@@ -0,0 +1,52 @@
+import logging
+
+from aiogram import Bot, Router, types
+from aiogram.exceptions import TelegramAPIError
+
+from callbacks import CheckoutCallback
+from config import ADMIN_ID
+from database import create_order
+from delivery import deliver_order
+from filters import CallbackPrefix
+
+router = Router(name="checkout")
+router.callback_query.filter(CallbackPrefix(CheckoutCallback))
+
+
+@router.callback_query(CheckoutCallback.filter())
+async def start_checkout(callback: types.CallbackQuery, bot: Bot):
+    logging.info("Starting checkout process for user %s", callback.from_user.id)
+    user_id = callback.from_user.id
+    # Ключ — сообщение с кнопкой «Оплатить»: повторное нажатие не спишет деньги второй раз
+    idempotency_key = f"checkout:{callback.message.chat.id}:{callback.message.message_id}"
+    order, error = await create_order(user_id, {'payment_method': 'По умолчанию'}, idempotency_key)
+    if error:
+        logging.info("Checkout rejected for user %s: %s", user_id, error)
+        await callback.message.answer(error)
+        await callback.answer()
+        return
+    if order['replayed']:
+        await callback.answer(f"Заказ #{order['id']} уже оформлен. ✅")
+        return
+
+    order_id = order['id']
+    order_summary = ""
+    for item in order['items']:
+        subtotal = item['price_at_purchase'] * item['quantity']
+        order_summary += f"{item['name']} x {item['quantity']} — {subtotal:.2f} руб. 💸\n"
+    admin_text = (
+        f"<b>📦 Новый заказ #{order_id}</b>\n\n"
+        f"<b>💳 Оплата:</b> По умолчанию\n\n"
+        f"<b>🛒 Ассеты:</b>\n{order_summary}\n"
+        f"<b>Итого:</b> {order['total_price']:.2f} руб. 💰"
+    )
+    await bot.send_message(ADMIN_ID, admin_text)
+
+    await callback.message.answer(
+        f"✅ Ваш заказ #{order_id} успешно оформлен! 🎉\nВаш баланс: {order['balance']:.2f} руб. 💳")
+    await callback.answer()
+    try:
+        await deliver_order(bot, callback.message.chat.id, order_id, order['items'])
+    except TelegramAPIError:
+        logging.exception("Delivery of order %s interrupted", order_id)
+        await callback.message.answer("Не удалось отправить все ассеты сразу. Мы дошлём оставшиеся позже. ⏳")
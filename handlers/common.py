@@ -0,0 +1,63 @@
+from aiogram import Bot, Router, F, types
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+
+from callbacks import MenuCallback
+from config import ADMIN_ID
+from filters import CallbackPrefix
+from handlers.catalog import open_product
+from keyboards import main_menu, catalog_menu
+from states import SupportStates
+
+router = Router(name="common")
+router.callback_query.filter(CallbackPrefix(MenuCallback))
+
+GREETING = "Привет! 👋 Я твой бот для поиска моделей/ассетов и всего разного из мира 3д! 🤖"
+
+
+# Обработчик команды /start
+@router.message(Command("start"))
+async def cmd_start(message: types.Message, command: CommandObject, state: FSMContext):
+    # Ссылка из inline-поиска открывает карточку ассета: /start product_<id>
+    if command.args and command.args.startswith("product_") and command.args[8:].isdigit():
+        if await open_product(message, state, int(command.args[8:])):
+            return
+    await message.answer(GREETING, reply_markup=main_menu)
+
+
+@router.callback_query(MenuCallback.filter(F.target == "main"))
+async def show_main_menu(callback: types.CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.answer(GREETING, reply_markup=main_menu)
+    await callback.answer()
+
+
+# Показать каталог
+@router.callback_query(MenuCallback.filter(F.target == "catalog"))
+async def show_catalog(callback: types.CallbackQuery):
+    if callback.message.text:
+        await callback.message.edit_text("Выберите раздел каталога:", reply_markup=catalog_menu)
+    else:
+        await callback.message.answer("Выберите раздел каталога:", reply_markup=catalog_menu)
+    await callback.answer()
+
+
+@router.callback_query(MenuCallback.filter(F.target == "support"))
+async def start_support(callback: types.CallbackQuery, state: FSMContext):
+    await state.set_state(SupportStates.waiting_for_question)
+    await callback.message.answer("Напишите ваш вопрос: ❓")
+    await callback.answer()
+
+
+@router.message(SupportStates.waiting_for_question)
+async def forward_to_admin(message: types.Message, state: FSMContext, bot: Bot):
+    await bot.forward_message(ADMIN_ID, message.chat.id, message.message_id)
+    await message.answer("Ваш вопрос отправлен менеджеру. ✅")
+    await state.clear()
+
+
+async def handle_random_text(message: types.Message, state: FSMContext):
+    current_state = await state.get_state()
+    if current_state and not message.text.startswith('/'):
+        await message.answer("Не понимаю ваш запрос. Пожалуйста, используйте кнопки или команды. 🔄",
+                             reply_markup=main_menu)
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from callbacks import MenuCallback, SectionCallback, CategoryCallback, CarouselCallback, AssetCallback, \
+    SearchCallback, CartCallback, CheckoutCallback, BalanceCallback, NewCategoryCallback, BroadcastCallback
+from config import CARD_CACHE_SIZE
+from database import catalog
+from pagination import page_keyboard, number_rows
+
+# Главное меню
+main_menu = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="Каталог 📋", callback_data=MenuCallback(target="catalog").pack())],
+    [InlineKeyboardButton(text="Корзина 🛒", callback_data=CartCallback(action="show").pack())],
+    [InlineKeyboardButton(text="Баланс 💰", callback_data=BalanceCallback(action="show").pack())],
+    [InlineKeyboardButton(text="Поддержка ❓", callback_data=MenuCallback(target="support").pack())],
+])
+
+catalog_menu = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="Бесплатные Assets 🆓", callback_data=SectionCallback(section="free").pack()),
+        InlineKeyboardButton(text="Платные Assets 💰", callback_data=SectionCallback(section="paid").pack())
+    ],
+    [InlineKeyboardButton(text="Корзина 🛒", callback_data=CartCallback(action="show").pack())],
+    [InlineKeyboardButton(text="Баланс 💰", callback_data=BalanceCallback(action="show").pack())],
+    [InlineKeyboardButton(text="Поддержка ❓", callback_data=MenuCallback(target="support").pack())]
+])
+
+balance_menu = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="💰 Пополнить", callback_data=BalanceCallback(action="top_up").pack())],
+    [InlineKeyboardButton(text="⬅️ Вернуться", callback_data=MenuCallback(target="main").pack())]
+])
+
+top_up_menu = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="💸 СБП (Юкасса)", callback_data=BalanceCallback(action="sbp").pack())],
+    [InlineKeyboardButton(text="⬅️ Вернуться", callback_data=MenuCallback(target="main").pack())]
+])
+
+category_section_menu = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="Бесплатно", callback_data=NewCategoryCallback(section="free").pack())],
+    [InlineKeyboardButton(text="Платно", callback_data=NewCategoryCallback(section="paid").pack())],
+])
+
+cart_menu = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="Оплатить 📦", callback_data=CheckoutCallback().pack())],
+    [InlineKeyboardButton(text="Очистить корзину 🗑️", callback_data=CartCallback(action="clear").pack())]
+])
+
+broadcast_confirm_menu = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="Начать рассылку 📣", callback_data=BroadcastCallback(confirm=True).pack())],
+    [InlineKeyboardButton(text="Отмена ❌", callback_data=BroadcastCallback(confirm=False).pack())]
+])
+
+_carousel_row = [InlineKeyboardButton(text="Назад ⬅️", callback_data=CarouselCallback(forward=False).pack()),
+                 InlineKeyboardButton(text="Вперед ➡️", callback_data=CarouselCallback(forward=True).pack())]
+_to_catalog_row = [InlineKeyboardButton(text="К категориям 📋", callback_data=MenuCallback(target="catalog").pack())]
+
+
+def render_product_card(product):
+    product_id = product[0]
+    if product[4] == 0:
+        price_text = "Бесплатно 🎁"
+        action = InlineKeyboardButton(text="Получить актив 🌐",
+                                      callback_data=AssetCallback(action="get", product_id=product_id).pack())
+    else:
+        price_text = f"Цена: {product[4]:.2f} руб. 💸"
+        action = InlineKeyboardButton(text="Добавить в корзину 🛒",
+                                      callback_data=AssetCallback(action="cart", product_id=product_id).pack())
+    text = f"<b>{product[2]}</b> 🛍️\n{product[3]}\n{price_text}"
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[[action], _carousel_row, _to_catalog_row])
+    return text, keyboard
+
+
+class CardCache:
+    """Готовые подписи и клавиатуры карточек ассетов.
+
+    Записи действительны для одной версии каталога: как только каталог
+    меняется, кэш очищается при следующем обращении.
+    """
+
+    def __init__(self, maxsize=CARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.version = catalog.version
+        self._cards = OrderedDict()
+
+    def get(self, product):
+        if self.version != catalog.version:
+            self._cards.clear()
+            self.version = catalog.version
+        product_id = product[0]
+        card = self._cards.get(product_id)
+        if card is None:
+            card = self._cards[product_id] = render_product_card(product)
+            if len(self._cards) > self.maxsize:
+                self._cards.popitem(last=False)
+        else:
+            self._cards.move_to_end(product_id)
+        return card
+
+
+product_cards = CardCache()
+
+
+def search_results_keyboard(products, offset, page_size, has_more):
+    rows = [
+        [InlineKeyboardButton(text=f"{product[2]} — {_price_label(product[4])}",
+                              callback_data=SearchCallback(action="open", value=product[0]).pack())]
+        for product in products
+    ]
+    navigation = []
+    if offset > 0:
+        previous_page = SearchCallback(action="page", value=max(0, offset - page_size))
+        navigation.append(InlineKeyboardButton(text="⬅️", callback_data=previous_page.pack()))
+    if has_more:
+        next_page = SearchCallback(action="page", value=offset + page_size)
+        navigation.append(InlineKeyboardButton(text="➡️", callback_data=next_page.pack()))
+    if navigation:
+        rows.append(navigation)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def section_categories_keyboard(section, page):
+    rows = [[InlineKeyboardButton(text=name, callback_data=CategoryCallback(category_id=category_id).pack())]
+            for category_id, name, _ in page.rows]
+    return page_keyboard(rows, page, lambda cursor, forward: SectionCallback(section=section, cursor=cursor,
+                                                                             forward=forward))
+
+
+def product_grid(category_id, page):
+    """Миниатюры для медиагруппы, список с ценами и номерная клавиатура страницы ассетов категории."""
+    media = [(product[5], f"{n}. {product[2]}") for n, product in enumerate(page.rows, 1)]
+    text = "Выберите номер ассета: 🔢\n" + "\n".join(
+        f"{n}. {product[2]} — {_price_label(product[4])}" for n, product in enumerate(page.rows, 1)
+    )
+    numbers = [
+        InlineKeyboardButton(text=str(n), callback_data=AssetCallback(action="open", product_id=product[0]).pack())
+        for n, product in enumerate(page.rows, 1)
+    ]
+    keyboard = page_keyboard(
+        number_rows(numbers), page,
+        lambda cursor, forward: CategoryCallback(category_id=category_id, cursor=cursor, forward=forward),
+        footer=[_to_catalog_row]
+    )
+    return media, text, keyboard
+
+
+def _price_label(price):
+    return "бесплатно" if price == 0 else f"{price:.2f} руб."
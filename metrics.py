@@ -0,0 +1,115 @@
+import functools
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus с произвольным набором меток.
+
+    Перцентили считаются на стороне Prometheus через histogram_quantile().
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = ",".join(labels + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return "\n".join(lines)
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def timed(histogram, label):
+    """Декоратор корутины: время вызова пишется в histogram с меткой label=имя функции."""
+    def decorator(func):
+        labels = {label: func.__name__}
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_all():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+async def metrics_handler(request):
+    return web.Response(text=render_all(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server(host, port, path="/metrics"):
+    app = web.Application()
+    app.router.add_get(path, metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+UPDATE_SECONDS = Histogram(
+    "bot_update_duration_seconds", "Time to process one update", ("update_type", "handler"))
+DB_QUERY_SECONDS = Histogram(
+    "bot_db_query_duration_seconds", "Time spent in database.py calls", ("query",))
+API_REQUEST_SECONDS = Histogram(
+    "bot_api_request_duration_seconds", "Latency of outbound Bot API requests", ("method",))
+FSM_STORAGE_SECONDS = Histogram(
+    "bot_fsm_storage_duration_seconds", "Latency of FSM storage operations", ("operation",))
+WRITE_BATCH_SIZE = Histogram(
+    "bot_db_write_batch_size", "Operations committed together by the write coalescer", (),
+    (1, 2, 4, 8, 16, 32, 64, 128, 256))
+WRITE_COMMIT_SECONDS = Histogram(
+    "bot_db_write_commit_duration_seconds", "Time to execute and commit one coalesced batch")
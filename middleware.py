@@ -1,22 +1,89 @@
+import asyncio
 import time
+from contextlib import asynccontextmanager
 from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
 from aiogram.types import Update, Message, CallbackQuery
 from typing import Callable, Any, Awaitable
 
+from metrics import UPDATE_SECONDS, API_REQUEST_SECONDS
+
+
 class TimeMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: пишет время обработки в гистограмму
+    с типом апдейта и именем сработавшего обработчика."""
+
     async def __call__(
         self,
         handler: Callable[[Update, dict[str, Any]], Awaitable[Any]],
         event: Update,
         data: dict[str, Any]
     ) -> Any:
-        start_time = time.time()
+        # Словарь передаётся по ссылке во вложенные observer'ы, где
+        # HandlerNameMiddleware записывает в него имя обработчика
+        labels = data["metrics_labels"] = {"handler": "unhandled"}
+        start_time = time.perf_counter()
         try:
-            # Вызов следующего обработчика
-            result = await handler(event, data)
+            return await handler(event, data)
         finally:
-            execution_time = time.time() - start_time
-            # Используем event.event_type напрямую как строку
-            event_type = getattr(event, 'event_type', "unknown")
-            print(f"Execution time for {event_type} (Update ID: {event.update_id}): {execution_time:.2f} seconds")
-        return result
\ No newline at end of file
+            UPDATE_SECONDS.observe(time.perf_counter() - start_time,
+                                   update_type=getattr(event, 'event_type', "unknown"), handler=labels["handler"])
+
+
+class UserEventIsolation(BaseEventIsolation):
+    """Изоляция событий FSM: апдейты одного пользователя обрабатываются по очереди,
+    апдейты разных пользователей — параллельно.
+
+    Dispatcher берёт замок до чтения состояния FSM, поэтому следующий апдейт
+    пользователя видит состояние, которое оставил предыдущий. Замки создаются
+    по требованию и удаляются, когда их никто не ждёт, поэтому память не растёт
+    с числом пользователей. asyncio.Lock будит ожидающих в порядке очереди, так
+    что апдейты пользователя выполняются в порядке поступления.
+    """
+
+    def __init__(self):
+        self._locks = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey):
+        # Ключ — пользователь, а не пара чат–пользователь: оплаты из разных чатов тоже идут по очереди
+        user_id = key.user_id
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[user_id]
+
+    async def close(self):
+        self._locks.clear()
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware observer'ов: к этому моменту обработчик уже выбран фильтрами."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: dict[str, Any]
+    ) -> Any:
+        labels = data.get("metrics_labels")
+        handler_object = data.get("handler")
+        if labels is not None and handler_object is not None:
+            labels["handler"] = getattr(handler_object.callback, "__name__", "unknown")
+        return await handler(event, data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: задержка каждого запроса к Bot API по методу."""
+
+    async def __call__(self, make_request, bot, method):
+        with API_REQUEST_SECONDS.time(method=type(method).__name__):
+            return await make_request(bot, method)
@@ -0,0 +1,422 @@
+import logging
+from datetime import datetime
+
+# Номер применённой миграции хранится в PRAGMA user_version базы.
+# Новые миграции добавляются только в конец списка MIGRATIONS.
+
+
+async def create_base_schema(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            balance REAL DEFAULT 0.0
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            section TEXT
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY,
+            category_id INTEGER,
+            name TEXT,
+            description TEXT,
+            price REAL,
+            photo TEXT,
+            asset_url TEXT,
+            is_free INTEGER DEFAULT 0
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS cart_items (
+            user_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER,
+            PRIMARY KEY (user_id, product_id)
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            status TEXT,
+            payment_method TEXT,
+            total_price REAL,
+            created_at TEXT
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            order_id INTEGER,
+            product_id INTEGER,
+            quantity INTEGER,
+            price_at_purchase REAL
+        )
+    ''')
+
+
+async def drop_legacy_order_columns(db):
+    async with db.execute('PRAGMA table_info(orders)') as cursor:
+        columns = [row[1] for row in await cursor.fetchall()]
+    if not {'delivery_method', 'name', 'phone', 'city'} & set(columns):
+        return
+    await db.execute('ALTER TABLE orders RENAME TO orders_old')
+    await db.execute('''
+        CREATE TABLE orders (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            status TEXT,
+            payment_method TEXT,
+            total_price REAL,
+            created_at TEXT
+        )
+    ''')
+    await db.execute('''
+        INSERT INTO orders (id, user_id, status, payment_method, total_price, created_at)
+        SELECT id, user_id, status, payment_method, total_price, created_at
+        FROM orders_old
+    ''')
+    await db.execute('DROP TABLE orders_old')
+
+
+async def add_foreign_keys(db):
+    # SQLite не умеет добавлять внешние ключи через ALTER TABLE, поэтому таблицы
+    # пересоздаются. Строки, ссылающиеся на уже удалённые записи, не переносятся.
+    await db.execute('''
+        CREATE TABLE products_new (
+            id INTEGER PRIMARY KEY,
+            category_id INTEGER REFERENCES categories(id) ON DELETE CASCADE,
+            name TEXT,
+            description TEXT,
+            price REAL,
+            photo TEXT,
+            asset_url TEXT,
+            is_free INTEGER DEFAULT 0
+        )
+    ''')
+    await db.execute('''
+        INSERT INTO products_new (id, category_id, name, description, price, photo, asset_url, is_free)
+        SELECT id, category_id, name, description, price, photo, asset_url, is_free
+        FROM products WHERE category_id IN (SELECT id FROM categories)
+    ''')
+    await db.execute('DROP TABLE products')
+    await db.execute('ALTER TABLE products_new RENAME TO products')
+
+    await db.execute('''
+        CREATE TABLE cart_items_new (
+            user_id INTEGER,
+            product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+            quantity INTEGER,
+            PRIMARY KEY (user_id, product_id)
+        )
+    ''')
+    await db.execute('''
+        INSERT INTO cart_items_new (user_id, product_id, quantity)
+        SELECT user_id, product_id, quantity
+        FROM cart_items WHERE product_id IN (SELECT id FROM products)
+    ''')
+    await db.execute('DROP TABLE cart_items')
+    await db.execute('ALTER TABLE cart_items_new RENAME TO cart_items')
+
+    # product_id в order_items намеренно без внешнего ключа: история заказов
+    # должна переживать удаление ассета из каталога.
+    await db.execute('''
+        CREATE TABLE order_items_new (
+            order_id INTEGER REFERENCES orders(id) ON DELETE CASCADE,
+            product_id INTEGER,
+            quantity INTEGER,
+            price_at_purchase REAL
+        )
+    ''')
+    await db.execute('''
+        INSERT INTO order_items_new (order_id, product_id, quantity, price_at_purchase)
+        SELECT order_id, product_id, quantity, price_at_purchase
+        FROM order_items WHERE order_id IN (SELECT id FROM orders)
+    ''')
+    await db.execute('DROP TABLE order_items')
+    await db.execute('ALTER TABLE order_items_new RENAME TO order_items')
+
+
+async def add_indexes(db):
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_products_category ON products (category_id, id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_categories_section ON categories (section)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)')
+
+
+async def create_fsm_states(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL
+        )
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)')
+
+
+async def track_order_delivery(db):
+    await db.execute('ALTER TABLE orders ADD COLUMN delivered INTEGER DEFAULT 0')
+    # Заказы, оформленные до отслеживания, уже выданы целиком
+    await db.execute('''
+        UPDATE orders SET status='delivered', delivered=(
+            SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE order_items.order_id = orders.id
+        )
+    ''')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)')
+
+
+async def create_product_search(db):
+    # Индекс хранит свою копию текста с «ё», заменённой на «е»: пользователи
+    # почти всегда пишут «е», а unicode61 эти буквы не отождествляет.
+    # Триггеры срабатывают и при каскадном удалении ассетов вместе с категорией.
+    await db.execute("""
+        CREATE VIRTUAL TABLE products_fts USING fts5(
+            name, description, tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    normalized = """
+        (rowid, name, description) VALUES (
+            new.id,
+            replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'),
+            replace(replace(new.description, 'ё', 'е'), 'Ё', 'Е')
+        )
+    """
+    await db.execute(f"""
+        CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts {normalized};
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = old.id;
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+            DELETE FROM products_fts WHERE rowid = old.id;
+            INSERT INTO products_fts {normalized};
+        END
+    """)
+    await db.execute("""
+        INSERT INTO products_fts (rowid, name, description)
+        SELECT id, replace(replace(name, 'ё', 'е'), 'Ё', 'Е'), replace(replace(description, 'ё', 'е'), 'Ё', 'Е')
+        FROM products
+    """)
+
+
+async def create_sales_aggregates(db):
+    # Дневные итоги продаж; create_order дописывает их в своей транзакции,
+    # поэтому отчёты читают десятки строк вместо всей истории заказов
+    await db.execute('''
+        CREATE TABLE sales_daily (
+            day TEXT PRIMARY KEY,
+            orders INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            revenue REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE TABLE sales_daily_products (
+            day TEXT,
+            product_id INTEGER,
+            units INTEGER NOT NULL,
+            revenue REAL NOT NULL,
+            PRIMARY KEY (day, product_id)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE TABLE sales_daily_categories (
+            day TEXT,
+            category_id INTEGER,
+            units INTEGER NOT NULL,
+            revenue REAL NOT NULL,
+            PRIMARY KEY (day, category_id)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE TABLE user_sales (
+            user_id INTEGER PRIMARY KEY,
+            orders INTEGER NOT NULL,
+            spent REAL NOT NULL,
+            last_order_at TEXT
+        )
+    ''')
+    await db.execute('CREATE INDEX idx_user_sales_spent ON user_sales (spent)')
+    await fill_sales_aggregates(db)
+
+
+async def fill_sales_aggregates(db):
+    """Пересчитывает таблицы продаж по всей истории заказов.
+
+    Категория берётся у ассета в каталоге, так что продажи удалённых
+    ассетов попадают в общие итоги, но не в разбивку по категориям.
+    """
+    for table in ('sales_daily', 'sales_daily_products', 'sales_daily_categories', 'user_sales'):
+        await db.execute(f'DELETE FROM {table}')
+    await db.execute('''
+        INSERT INTO sales_daily (day, orders, units, revenue)
+        SELECT substr(o.created_at, 1, 10), COUNT(DISTINCT o.id), SUM(oi.quantity),
+               SUM(oi.quantity * oi.price_at_purchase)
+        FROM orders o JOIN order_items oi ON oi.order_id = o.id
+        GROUP BY 1
+    ''')
+    await db.execute('''
+        INSERT INTO sales_daily_products (day, product_id, units, revenue)
+        SELECT substr(o.created_at, 1, 10), oi.product_id, SUM(oi.quantity), SUM(oi.quantity * oi.price_at_purchase)
+        FROM orders o JOIN order_items oi ON oi.order_id = o.id
+        GROUP BY 1, 2
+    ''')
+    await db.execute('''
+        INSERT INTO sales_daily_categories (day, category_id, units, revenue)
+        SELECT substr(o.created_at, 1, 10), p.category_id, SUM(oi.quantity), SUM(oi.quantity * oi.price_at_purchase)
+        FROM orders o JOIN order_items oi ON oi.order_id = o.id JOIN products p ON p.id = oi.product_id
+        GROUP BY 1, 2
+    ''')
+    await db.execute('''
+        INSERT INTO user_sales (user_id, orders, spent, last_order_at)
+        SELECT o.user_id, COUNT(DISTINCT o.id), SUM(oi.quantity * oi.price_at_purchase), MAX(o.created_at)
+        FROM orders o JOIN order_items oi ON oi.order_id = o.id
+        GROUP BY 1
+    ''')
+
+
+async def create_idempotency_keys(db):
+    await db.execute('''
+        CREATE TABLE idempotency_keys (
+            key TEXT PRIMARY KEY,
+            result TEXT,
+            created_at REAL
+        )
+    ''')
+    await db.execute('CREATE INDEX idx_idempotency_keys_created ON idempotency_keys (created_at)')
+
+
+async def create_broadcasts(db):
+    await db.execute('''
+        CREATE TABLE broadcast_jobs (
+            id INTEGER PRIMARY KEY,
+            admin_chat_id INTEGER,
+            text TEXT,
+            source_chat_id INTEGER,
+            source_message_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'running',
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT,
+            finished_at TEXT
+        )
+    ''')
+    await db.execute('CREATE INDEX idx_broadcast_jobs_status ON broadcast_jobs (status)')
+    await db.execute('''
+        CREATE TABLE broadcast_recipients (
+            job_id INTEGER REFERENCES broadcast_jobs(id) ON DELETE CASCADE,
+            user_id INTEGER,
+            status TEXT NOT NULL,
+            error TEXT,
+            PRIMARY KEY (job_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+async def create_cache_epochs(db):
+    # Номер версии каталога общий для всех процессов бота: по его смене
+    # воркеры сбрасывают свои кэши после изменений, сделанных в другом процессе
+    await db.execute('CREATE TABLE cache_epochs (name TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID')
+    await db.execute("INSERT INTO cache_epochs (name, version) VALUES ('catalog', 0)")
+
+
+async def create_balance_ledger(db):
+    # Суммы — целые копейки. Баланс = снимок + транзакции после last_transaction_id снимка;
+    # ledger_checkpoint — до какой транзакции снимки уже свёрнуты
+    await db.execute('''
+        CREATE TABLE balance_transactions (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            amount INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            order_id INTEGER,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    await db.execute('CREATE INDEX idx_balance_transactions_user ON balance_transactions (user_id, id)')
+    await db.execute('''
+        CREATE TABLE balance_snapshots (
+            user_id INTEGER PRIMARY KEY,
+            balance INTEGER NOT NULL,
+            last_transaction_id INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE TABLE ledger_checkpoint (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_transaction_id INTEGER NOT NULL
+        )
+    ''')
+    # Текущие балансы переносятся в журнал открывающими записями; users.balance больше не обновляется
+    now = datetime.now().isoformat()
+    await db.execute('''
+        INSERT INTO balance_transactions (user_id, amount, kind, created_at)
+        SELECT user_id, CAST(ROUND(balance * 100) AS INTEGER), 'opening', ?
+        FROM users WHERE ROUND(balance * 100) != 0 ORDER BY user_id
+    ''', (now,))
+    await db.execute('''
+        INSERT INTO balance_snapshots (user_id, balance, last_transaction_id, updated_at)
+        SELECT user_id, amount, id, ? FROM balance_transactions
+    ''', (now,))
+    await db.execute('''
+        INSERT INTO ledger_checkpoint (id, last_transaction_id)
+        SELECT 1, COALESCE(MAX(id), 0) FROM balance_transactions
+    ''')
+
+
+MIGRATIONS = [
+    create_base_schema,
+    drop_legacy_order_columns,
+    add_foreign_keys,
+    add_indexes,
+    create_fsm_states,
+    track_order_delivery,
+    create_product_search,
+    create_sales_aggregates,
+    create_idempotency_keys,
+    create_broadcasts,
+    create_cache_epochs,
+    create_balance_ledger,
+]
+
+
+async def migrate(db):
+    """Применяет к базе все ещё не применённые миграции, каждую в своей транзакции."""
+    async with db.execute('PRAGMA user_version') as cursor:
+        current = (await cursor.fetchone())[0]
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if version <= current:
+            continue
+        # Проверку внешних ключей нельзя переключить внутри транзакции
+        await db.execute('PRAGMA foreign_keys=OFF')
+        try:
+            await db.execute('BEGIN IMMEDIATE')
+            await migration(db)
+            async with db.execute('PRAGMA foreign_key_check') as cursor:
+                violations = await cursor.fetchall()
+            if violations:
+                raise RuntimeError(f"Migration {version} ({migration.__name__}) broke foreign keys: {violations}")
+            await db.execute(f'PRAGMA user_version={version}')
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+        finally:
+            await db.execute('PRAGMA foreign_keys=ON')
+        logging.info("Applied database migration %s (%s)", version, migration.__name__)
+    return max(current, len(MIGRATIONS))
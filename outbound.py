@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMediaGroup
+
+from config import SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_GROUP_RATE, SEND_MAX_RETRIES
+
+MAX_IDLE_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Токен-бакет с резервированием: токены можно взять в долг.
+
+    reserve() сразу списывает токены и возвращает, сколько секунд нужно
+    подождать до отправки. Так ожидающие вызовы выстраиваются в очередь
+    в порядке обращения без отдельной задачи-диспетчера.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost=1):
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= cost
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def refund(self, cost=1):
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+    def block(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self):
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """Middleware сессии бота: все исходящие вызовы с chat_id проходят через
+    общий и поканальный токен-бакеты, а TelegramRetryAfter повторяется после паузы.
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 group_rate=SEND_GROUP_RATE, max_retries=SEND_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._chats = {}
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_IDLE_BUCKETS:
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle()}
+            # Отрицательный id — группа или канал, у них лимит строже
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(self.group_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id, cost):
+        # Альбом в чате — одно сообщение, но в общий лимит идёт каждый файл
+        delay = max(self._chat_bucket(chat_id).reserve(), self.global_bucket.reserve(cost))
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, cost)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning("Flood control on %s for chat %s, retrying in %s s",
+                                type(method).__name__, chat_id, e.retry_after)
+                # Отклонённый запрос не доставлен, его токены возвращаются
+                self._chat_bucket(chat_id).refund()
+                self.global_bucket.refund(cost)
+                self._chat_bucket(chat_id).block(e.retry_after)
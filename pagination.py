@@ -0,0 +1,74 @@
+"""Постраничный просмотр длинных списков и сетки миниатюр ассетов.
+
+Страница задаётся id крайней строки (cursor) и направлением, поэтому её
+чтение — один запрос по индексу с LIMIT, а не OFFSET по всему списку.
+"""
+from typing import NamedTuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto
+
+
+class Page(NamedTuple):
+    rows: tuple
+    has_prev: bool
+    has_next: bool
+
+
+async def load_page(fetch, cursor, forward, limit):
+    """Читает страницу через fetch(cursor, forward, limit), который возвращает (rows, has_more).
+
+    Если соседняя страница опустела, например её строки удалили, возвращается первая.
+    """
+    rows, has_more = await fetch(cursor, forward, limit)
+    if not rows and cursor:
+        cursor, forward = 0, True
+        rows, has_more = await fetch(cursor, forward, limit)
+    if forward:
+        return Page(rows, cursor > 0, has_more)
+    return Page(rows, has_more, True)
+
+
+def page_keyboard(rows, page, turn, footer=()):
+    """Ряды кнопок страницы, ряд «⬅️ ➡️» и footer.
+
+    turn(cursor, forward) возвращает CallbackData соседней страницы; cursor — id
+    первой строки для перехода назад и последней для перехода вперёд.
+    """
+    rows = list(rows)
+    navigation = []
+    if page.has_prev:
+        navigation.append(InlineKeyboardButton(text="⬅️", callback_data=turn(page.rows[0][0], False).pack()))
+    if page.has_next:
+        navigation.append(InlineKeyboardButton(text="➡️", callback_data=turn(page.rows[-1][0], True).pack()))
+    if navigation:
+        rows.append(navigation)
+    rows.extend(footer)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def number_rows(buttons, columns=5):
+    """Номерные кнопки сетки рядами по columns."""
+    return [buttons[i:i + columns] for i in range(0, len(buttons), columns)]
+
+
+async def turn_page(message, keyboard):
+    """Меняет клавиатуру сообщения со списком на соседнюю страницу."""
+    try:
+        await message.edit_reply_markup(reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+
+
+async def send_grid(message, media, text, keyboard):
+    """Отправляет миниатюры одной медиагруппой и под ними text с клавиатурой выбора.
+
+    media — пары (file_id, подпись). В медиагруппе от 2 до 10 фото,
+    поэтому одна миниатюра уходит обычным фото.
+    """
+    if len(media) == 1:
+        await message.answer_photo(photo=media[0][0], caption=media[0][1])
+    else:
+        await message.answer_media_group([InputMediaPhoto(media=photo, caption=caption) for photo, caption in media])
+    await message.answer(text, reply_markup=keyboard)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import uuid
+
+import aiohttp
+
+from config import YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, YOOKASSA_API_URL, YOOKASSA_RETURN_URL, \
+    YOOKASSA_TIMEOUT, YOOKASSA_RETRIES
+
+# 202 означает, что ЮKassa ещё обрабатывает запрос с этим ключом идемпотентности
+RETRY_STATUSES = {202, 429, 500, 502, 503, 504}
+
+
+class YooKassaClient:
+    """Асинхронный клиент API ЮKassa на общей aiohttp-сессии.
+
+    Повторные попытки отправляются с тем же Idempotence-Key, поэтому
+    ретрай после таймаута не создаст второй платёж.
+    """
+
+    def __init__(self, shop_id, secret_key, api_url="https://api.yookassa.ru/v3", return_url=None,
+                 timeout=10.0, retries=3, backoff=0.5, pool_size=20):
+        self.shop_id = shop_id
+        self.secret_key = secret_key
+        self.api_url = api_url.rstrip("/")
+        self.return_url = return_url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+                auth=aiohttp.BasicAuth(str(self.shop_id or ""), self.secret_key or ""),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, method, path, payload=None, idempotence_key=None):
+        session = self._get_session()
+        headers = {"Idempotence-Key": idempotence_key} if idempotence_key else {}
+        url = f"{self.api_url}{path}"
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt
+            try:
+                async with session.request(method, url, json=payload, headers=headers) as response:
+                    if response.status == 200:
+                        return await response.json()
+                    if response.status not in RETRY_STATUSES:
+                        logging.error("YooKassa %s %s failed with %s: %s",
+                                      method, path, response.status, await response.text())
+                        return None
+                    retry_after = response.headers.get("Retry-After")
+                    if retry_after and retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+                    logging.warning("YooKassa %s %s returned %s, attempt %s", method, path, response.status,
+                                    attempt + 1)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning("YooKassa %s %s error on attempt %s: %r", method, path, attempt + 1, e)
+            if attempt < self.retries:
+                await asyncio.sleep(delay)
+        logging.error("YooKassa %s %s gave up after %s attempts", method, path, self.retries + 1)
+        return None
+
+    async def create_payment(self, user_id, amount, idempotence_key=None):
+        """Создаёт платёж через СБП и возвращает ссылку на оплату или None."""
+        payload = {
+            "amount": {"value": f"{amount:.2f}", "currency": "RUB"},
+            "capture": True,
+            "description": f"Пополнение баланса для пользователя {user_id}",
+            "payment_method_data": {"type": "sbp"},
+            "confirmation": {"type": "redirect", "return_url": self.return_url},
+            "metadata": {"user_id": user_id},
+        }
+        payment = await self._request("POST", "/payments", payload, idempotence_key or str(uuid.uuid4()))
+        if payment is None:
+            return None
+        return payment.get("confirmation", {}).get("confirmation_url")
+
+    async def get_payment(self, payment_id):
+        return await self._request("GET", f"/payments/{payment_id}")
+
+
+yookassa = YooKassaClient(
+    YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, api_url=YOOKASSA_API_URL, return_url=YOOKASSA_RETURN_URL,
+    timeout=YOOKASSA_TIMEOUT, retries=YOOKASSA_RETRIES,
+)
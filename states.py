@@ -17,6 +17,12 @@ class AddProductStates(StatesGroup):
     photo = State()
     asset_file = State()
 
+class ImportCatalogStates(StatesGroup):
+    manifest = State()
+
+class BroadcastStates(StatesGroup):
+    confirm = State()
+
 class AddCategoryStates(StatesGroup):
     name = State()
     section = State()
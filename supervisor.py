@@ -0,0 +1,221 @@
+"""Супервизор: один процесс принимает апдейты и раздаёт их N воркерам по id пользователя.
+
+Доставка в воркеры — не более одного раза. Апдейты, уже записанные в pipe воркера,
+который упал или был убит, теряются вместе с ним. При переполнении очереди воркера
+новые апдейты для него отбрасываются, чтобы приём не вставал для всех пользователей.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import time
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.exceptions import TelegramAPIError
+
+from config import UPDATE_CONCURRENCY, WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, \
+    WORKERS, WORKER_INDEX
+
+POLLING_TIMEOUT = 30
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+# Воркер, проживший дольше этого, считается здоровым, и задержка перезапуска сбрасывается
+STABLE_UPTIME = 60.0
+QUEUE_SIZE = 10000
+
+
+def update_owner_id(update):
+    """id пользователя или чата, по которому апдейт закрепляется за воркером."""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        for path in (("from", "id"), ("user", "id"), ("chat", "id"), ("message", "chat", "id")):
+            value = event
+            for part in path:
+                value = value.get(part) if isinstance(value, dict) else None
+            if isinstance(value, int):
+                return value
+    return 0
+
+
+def worker_for(owner_id, workers):
+    # Остаток от деления стабилен между процессами и перезапусками, в отличие от hash() строк
+    return owner_id % workers
+
+
+def owns(owner_id):
+    """Отвечает ли этот процесс за пользователя; в однопроцессном режиме — за всех."""
+    return WORKER_INDEX < 0 or worker_for(owner_id, WORKERS) == WORKER_INDEX
+
+
+class Worker:
+    """Дочерний процесс с обычным Dispatcher; апдейты приходят в stdin построчно в JSON."""
+
+    def __init__(self, index, workers):
+        self.index = index
+        self.workers = workers
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.dropped = 0
+        self.process = None
+        self.restart_delay = RESTART_DELAY
+
+    async def start(self):
+        env = dict(os.environ, WORKER_INDEX=str(self.index), WORKERS=str(self.workers))
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(sys.argv[0]), stdin=asyncio.subprocess.PIPE, env=env)
+        self.started_at = time.monotonic()
+        logging.info("Started worker %s (pid %s)", self.index, self.process.pid)
+
+    async def pump(self):
+        # Строка, которую не удалось записать в упавший воркер, уйдёт в перезапущенный
+        line = None
+        while True:
+            if line is None:
+                line = await self.queue.get()
+                if line is None:
+                    break
+            try:
+                self.process.stdin.write(line)
+                await self.process.stdin.drain()
+                line = None
+            except (BrokenPipeError, ConnectionResetError):
+                await asyncio.sleep(0.1)
+        self.process.stdin.close()
+
+    async def supervise(self, stopping):
+        while True:
+            code = await self.process.wait()
+            if stopping.is_set():
+                logging.info("Worker %s exited with code %s", self.index, code)
+                return
+            if time.monotonic() - self.started_at > STABLE_UPTIME:
+                self.restart_delay = RESTART_DELAY
+            logging.error("Worker %s exited with code %s, restarting in %.0f s", self.index, code, self.restart_delay)
+            await asyncio.sleep(self.restart_delay)
+            self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+            await self.start()
+
+
+class Supervisor:
+    """Единая точка приёма апдейтов и N воркеров.
+
+    Апдейты одного пользователя всегда попадают в один воркер, поэтому его
+    FSM-состояние, корзина в кэше и порядок обработки остаются в одном процессе.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, workers):
+        self.bot = bot
+        self.dp = dp
+        self.workers = [Worker(index, workers) for index in range(workers)]
+        self.stopping = asyncio.Event()
+
+    async def route(self, update):
+        worker = self.workers[worker_for(update_owner_id(update), len(self.workers))]
+        # Ожидание места в очереди одного зависшего воркера остановило бы приём для всех
+        try:
+            worker.queue.put_nowait(json.dumps(update, ensure_ascii=False).encode() + b"\n")
+        except asyncio.QueueFull:
+            worker.dropped += 1
+            logging.warning("Queue of worker %s is full, dropped update %s (%s dropped so far)",
+                            worker.index, update.get("update_id"), worker.dropped)
+
+    async def poll(self):
+        offset = None
+        allowed_updates = self.dp.resolve_used_update_types()
+        while not self.stopping.is_set():
+            try:
+                updates = await self.bot.get_updates(offset=offset, timeout=POLLING_TIMEOUT,
+                                                     allowed_updates=allowed_updates)
+            except TelegramAPIError:
+                logging.exception("Failed to fetch updates")
+                await asyncio.sleep(RESTART_DELAY)
+                continue
+            for update in updates:
+                await self.route(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+                offset = update.update_id + 1
+
+    async def handle_webhook(self, request):
+        if not WEBHOOK_SECRET or request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=401)
+        await self.route(await request.json())
+        return web.Response()
+
+    async def serve_webhook(self):
+        # Без секрета кто угодно мог бы прислать апдейт от имени администратора
+        if not WEBHOOK_SECRET:
+            raise RuntimeError("WEBHOOK_SECRET is required in webhook mode")
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self.handle_webhook)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        if WEBHOOK_BASE_URL:
+            await self.bot.set_webhook(f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET,
+                                       allowed_updates=self.dp.resolve_used_update_types())
+        logging.info("Serving webhook on http://%s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+        try:
+            await self.stopping.wait()
+        finally:
+            await runner.cleanup()
+
+    async def run(self, webhook=False):
+        for worker in self.workers:
+            await worker.start()
+        tasks = [asyncio.create_task(worker.supervise(self.stopping)) for worker in self.workers]
+        pumps = [asyncio.create_task(worker.pump()) for worker in self.workers]
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except NotImplementedError:
+                pass
+        intake = asyncio.create_task(self.serve_webhook() if webhook else self.poll())
+        await self.stopping.wait()
+        intake.cancel()
+        await asyncio.gather(intake, return_exceptions=True)
+        # Воркеры дорабатывают принятые апдейты и завершаются по концу stdin
+        for worker in self.workers:
+            await worker.queue.put(None)
+        await asyncio.gather(*pumps, *tasks, return_exceptions=True)
+        await self.bot.session.close()
+
+
+async def run_worker(dp: Dispatcher, bot: Bot, index):
+    """Обрабатывает апдейты из stdin до его закрытия супервизором."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=2 ** 24)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    # Остановкой управляет супервизор: он закрывает stdin после SIGINT
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: None)
+        except NotImplementedError:
+            pass
+
+    semaphore = asyncio.Semaphore(UPDATE_CONCURRENCY) if UPDATE_CONCURRENCY else None
+    tasks = set()
+
+    async def process(update):
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logging.exception("Worker %s failed to process update %s", index, update.get("update_id"))
+        finally:
+            if semaphore:
+                semaphore.release()
+
+    await dp.emit_startup(bot=bot, **dp.workflow_data)
+    try:
+        while line := await reader.readline():
+            if semaphore:
+                await semaphore.acquire()
+            task = asyncio.create_task(process(json.loads(line)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await dp.emit_shutdown(bot=bot, **dp.workflow_data)
+        await bot.session.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# config.py читает окружение при импорте, поэтому оно задаётся до импорта модулей бота
+os.environ.setdefault("BOT_TOKEN", "123456:TESTTESTTESTTESTTESTTESTTESTTESTTES")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="assetflow-test-"), "test.db"))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
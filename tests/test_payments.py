@@ -0,0 +1,70 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from payments import YooKassaClient
+from yookassa_stub import create_app
+
+
+async def _create_payment(retries=3, timeout=5.0, slow_first=0.0, **stub):
+    app = create_app(**stub)
+    keys = []
+
+    @web.middleware
+    async def record_key(request, handler):
+        keys.append(request.headers.get("Idempotence-Key"))
+        if len(keys) == 1:
+            await asyncio.sleep(slow_first)
+        return await handler(request)
+
+    app.middlewares.append(record_key)
+    async with TestServer(app) as server:
+        client = YooKassaClient("shop", "secret", api_url=str(server.make_url("/v3")), return_url="https://bot/return",
+                                timeout=timeout, retries=retries, backoff=0)
+        try:
+            url = await client.create_payment(7, 100)
+        finally:
+            await client.close()
+    return url, keys, app["payments"]
+
+
+def test_retries_server_errors_with_the_same_key():
+    url, keys, payments = asyncio.run(_create_payment(fail_first=2))
+    assert len(keys) == 3
+    assert len(set(keys)) == 1
+    assert len(payments) == 1
+    assert url.endswith(f"/checkout/{next(iter(payments))}")
+
+
+def test_retries_too_many_requests():
+    url, keys, payments = asyncio.run(_create_payment(fail_first=1, fail_status=429))
+    assert len(keys) == 2
+    assert url is not None and len(payments) == 1
+
+
+def test_gives_up_after_retries():
+    url, keys, payments = asyncio.run(_create_payment(retries=2, fail_first=5))
+    assert url is None
+    assert len(keys) == 3
+    assert not payments
+
+
+def test_client_error_is_not_retried():
+    url, keys, _ = asyncio.run(_create_payment(fail_first=1, fail_status=400))
+    assert url is None
+    assert len(keys) == 1
+
+
+def test_timeout_is_retried_with_the_same_key():
+    url, keys, payments = asyncio.run(_create_payment(timeout=0.2, slow_first=1.0))
+    assert url is not None
+    assert len(keys) == 2
+    assert len(set(keys)) == 1
+    assert len(payments) == 1
+
+
+def test_gives_up_after_timeouts():
+    url, keys, _ = asyncio.run(_create_payment(retries=1, timeout=0.1, delay=0.5))
+    assert url is None
+    assert len(keys) == 2
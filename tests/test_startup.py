@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Время импорта main и регистрации роутеров сверх импорта сторонних пакетов. Почти весь
+# холодный старт — это aiogram, и без вычета его доля скрыла бы регресс в наших модулях
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "300"))
+
+# Сторонние пакеты, которые main и зарегистрированные роутеры импортируют при старте
+BASELINE_IMPORTS = (
+    "aiogram", "aiogram.client.default", "aiogram.client.session.middlewares.base", "aiogram.dispatcher.event.bases",
+    "aiogram.exceptions", "aiogram.filters", "aiogram.filters.callback_data", "aiogram.fsm.context",
+    "aiogram.fsm.state", "aiogram.fsm.storage.base", "aiogram.methods", "aiogram.types",
+    "aiogram.webhook.aiohttp_server", "aiohttp", "aiohttp.web", "aiosqlite", "dotenv",
+)
+
+PROBE = """
+import asyncio, importlib, json, sys, time
+from datetime import datetime
+
+for module in sys.argv[1:]:
+    importlib.import_module(module)
+
+start = time.perf_counter()
+import main
+main.register_handlers(main.dp)
+startup_ms = (time.perf_counter() - start) * 1000
+admin_at_startup = "handlers.admin" in sys.modules
+
+from aiogram.types import Chat, Message, Update, User
+from config import ADMIN_ID
+from database import init_db, close_db
+
+
+async def first_admin_update():
+    await init_db()
+    user = User(id=ADMIN_ID, is_bot=False, first_name="Admin")
+    message = Message(message_id=1, date=datetime.now(), chat=Chat(id=ADMIN_ID, type="private"), from_user=user,
+                      text="hello")
+    await main.dp.feed_update(main.bot, Update(update_id=1, message=message))
+    await main.dp.fsm.close()
+    await close_db()
+
+asyncio.run(first_admin_update())
+print(json.dumps({"startup_ms": startup_ms, "admin_at_startup": admin_at_startup,
+                  "admin_after_update": "handlers.admin" in sys.modules}))
+"""
+
+
+def _probe():
+    # Новый интерпретатор на каждый замер, чтобы импорты не брались из кэша модулей
+    result = subprocess.run([sys.executable, "-c", PROBE, *BASELINE_IMPORTS], capture_output=True, text=True,
+                            cwd=ROOT, env=os.environ)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_startup_within_budget_and_admin_loaded_lazily():
+    runs = [_probe() for _ in range(2)]
+    for run in runs:
+        assert not run["admin_at_startup"], "handlers.admin imported before the admin's first update"
+        assert run["admin_after_update"], "handlers.admin not imported on the admin's first update"
+    startup_ms = min(run["startup_ms"] for run in runs)
+    assert startup_ms <= STARTUP_BUDGET_MS, f"project startup {startup_ms:.0f} ms above {STARTUP_BUDGET_MS:.0f} ms"
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime
+from unittest import mock
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from config import METRICS_PATH
+from supervisor import Supervisor
+from webhook import create_app
+
+SECRET = "test-secret"
+PATH = "/webhook"
+
+
+def _update(update_id, text, user_id=7):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+
+async def _post_updates(headers):
+    received = []
+    dp = Dispatcher()
+
+    @dp.message()
+    async def record(message):
+        received.append(message.text)
+
+    bot = Bot("123456:TESTTESTTESTTESTTESTTESTTESTTESTTES")
+    async with TestClient(TestServer(create_app(dp, bot, path=PATH, secret_token=SECRET))) as client:
+        response = await client.post(PATH, json=_update(1, "hello"), headers=headers)
+        # Апдейт обрабатывается в фоне после ответа Telegram
+        await asyncio.sleep(0.1)
+    return response.status, received
+
+
+def test_update_with_secret_is_handled():
+    status, received = asyncio.run(_post_updates({"X-Telegram-Bot-Api-Secret-Token": SECRET}))
+    assert status == 200
+    assert received == ["hello"]
+
+
+def test_update_without_secret_is_rejected():
+    status, received = asyncio.run(_post_updates({}))
+    assert status == 401
+    assert received == []
+
+
+def test_update_with_wrong_secret_is_rejected():
+    status, received = asyncio.run(_post_updates({"X-Telegram-Bot-Api-Secret-Token": "forged"}))
+    assert status == 401
+    assert received == []
+
+
+def test_app_requires_secret():
+    with pytest.raises(RuntimeError):
+        create_app(Dispatcher(), Bot("123456:TESTTESTTESTTESTTESTTESTTESTTESTTES"), path=PATH, secret_token=None)
+
+
+async def _get_metrics():
+    app = create_app(Dispatcher(), Bot("123456:TESTTESTTESTTESTTESTTESTTESTTESTTES"), path=PATH, secret_token=SECRET)
+    async with TestClient(TestServer(app)) as client:
+        response = await client.get(METRICS_PATH)
+    return response.status
+
+
+def test_app_does_not_expose_metrics():
+    assert asyncio.run(_get_metrics()) == 404
+
+
+async def _post_to_supervisor(secret, headers):
+    routed = []
+
+    class Recorder(Supervisor):
+        def __init__(self):
+            pass
+
+        async def route(self, update):
+            routed.append(update["update_id"])
+
+    app = web.Application()
+    app.router.add_post(PATH, Recorder().handle_webhook)
+    with mock.patch("supervisor.WEBHOOK_SECRET", secret):
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post(PATH, json=_update(1, "hello"), headers=headers)
+    return response.status, routed
+
+
+def test_supervisor_routes_update_with_secret():
+    status, routed = asyncio.run(_post_to_supervisor(SECRET, {"X-Telegram-Bot-Api-Secret-Token": SECRET}))
+    assert status == 200
+    assert routed == [1]
+
+
+def test_supervisor_rejects_update_without_secret():
+    status, routed = asyncio.run(_post_to_supervisor(SECRET, {}))
+    assert status == 401
+    assert routed == []
+
+
+def test_supervisor_rejects_updates_when_secret_is_unset():
+    status, routed = asyncio.run(_post_to_supervisor(None, {}))
+    assert status == 401
+    assert routed == []
+
+
+async def _route_to_full_worker():
+    supervisor = Supervisor(None, Dispatcher(), 2)
+    full = supervisor.workers[1]
+    full.queue = asyncio.Queue(1)
+    # Пользователь 7 закреплён за воркером 1, чья очередь переполнится, пользователь 8 — за воркером 0
+    for update in (_update(1, "a"), _update(2, "b"), _update(3, "c", user_id=8)):
+        await asyncio.wait_for(supervisor.route(update), timeout=1)
+    return full, supervisor.workers[0]
+
+
+def test_supervisor_drops_updates_for_full_worker_without_blocking():
+    full, other = asyncio.run(_route_to_full_worker())
+    assert full.queue.qsize() == 1
+    assert full.dropped == 1
+    assert other.queue.qsize() == 1
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_DRAIN_TIMEOUT
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """Отвечает Telegram сразу, а при остановке дожидается уже принятых обновлений."""
+
+    def __init__(self, *args, drain_timeout=WEBHOOK_DRAIN_TIMEOUT, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+
+    async def close(self):
+        pending = set(self._background_feed_update_tasks)
+        if pending:
+            logging.info("Draining %s in-flight updates", len(pending))
+            _, pending = await asyncio.wait(pending, timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logging.warning("Cancelled %s updates still running after %.0f s", len(pending), self.drain_timeout)
+        await super().close()
+
+
+def create_app(dp: Dispatcher, bot: Bot, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET):
+    # Без секрета кто угодно мог бы прислать апдейт от имени администратора
+    if not secret_token:
+        raise RuntimeError("WEBHOOK_SECRET is required in webhook mode")
+    app = web.Application()
+    # Обработчик регистрируется до setup_application, чтобы очередь обновлений
+    # слилась раньше, чем dispatcher.shutdown закроет базу
+    DrainingRequestHandler(dispatcher=dp, bot=bot, secret_token=secret_token).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    # Метрики сюда не добавляются: это приложение открыто наружу, они отдаются start_metrics_server
+    return app
+
+
+async def set_webhook(bot: Bot, dispatcher: Dispatcher):
+    if not WEBHOOK_BASE_URL:
+        logging.warning("WEBHOOK_BASE_URL is not set, leaving the webhook registration unchanged")
+        return
+    await bot.set_webhook(
+        f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+    )
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+    dp.startup.register(set_webhook)
+    runner = web.AppRunner(create_app(dp, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logging.info("Serving webhook on http://%s:%s%s", host, port, WEBHOOK_PATH)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: остановка по KeyboardInterrupt
+    try:
+        await stop.wait()
+    finally:
+        # Сначала закрывается приём соединений, затем сливаются уже принятые обновления
+        await runner.cleanup()
@@ -0,0 +1,87 @@
+"""Локальная заглушка API ЮKassa для проверки платежей без сети.
+
+Запуск:
+    python yookassa_stub.py --port 8081 --fail-first 2 --fail-status 429 --delay 0.5
+и в .env:
+    YOOKASSA_API_URL=http://127.0.0.1:8081/v3
+
+Платежи с одинаковым Idempotence-Key возвращаются без повторного создания,
+--fail-first отвечает --fail-status (по умолчанию 503) на первые N запросов
+с новым ключом, --delay задерживает каждый ответ.
+"""
+import argparse
+import asyncio
+import uuid
+
+from aiohttp import web
+
+
+def create_app(fail_first=0, delay=0.0, fail_status=503):
+    app = web.Application()
+    app["payments"] = {}
+    app["by_key"] = {}
+    app["failures"] = {}
+
+    async def create_payment(request):
+        if delay:
+            await asyncio.sleep(delay)
+        key = request.headers.get("Idempotence-Key")
+        if not key:
+            return web.json_response({"type": "error", "code": "invalid_request",
+                                      "description": "Idempotence-Key header is required"}, status=400)
+        if key in app["by_key"]:
+            return web.json_response(app["payments"][app["by_key"][key]])
+        failures = app["failures"].get(key, 0)
+        if failures < fail_first:
+            app["failures"][key] = failures + 1
+            if fail_status == 429:
+                return web.json_response({"type": "error", "code": "too_many_requests"}, status=429,
+                                         headers={"Retry-After": "0"})
+            return web.json_response({"type": "error", "code": "internal_server_error"}, status=fail_status)
+
+        body = await request.json()
+        payment_id = str(uuid.uuid4())
+        payment = {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": body["amount"],
+            "description": body.get("description"),
+            "metadata": body.get("metadata", {}),
+            "confirmation": {
+                "type": "redirect",
+                "confirmation_url": f"{request.scheme}://{request.host}/checkout/{payment_id}",
+            },
+        }
+        app["payments"][payment_id] = payment
+        app["by_key"][key] = payment_id
+        return web.json_response(payment)
+
+    async def get_payment(request):
+        payment = app["payments"].get(request.match_info["payment_id"])
+        if payment is None:
+            return web.json_response({"type": "error", "code": "not_found"}, status=404)
+        return web.json_response(payment)
+
+    async def checkout(request):
+        payment = app["payments"].get(request.match_info["payment_id"])
+        if payment is None:
+            raise web.HTTPNotFound()
+        payment.update(status="succeeded", paid=True)
+        return web.Response(text="Оплата прошла успешно")
+
+    app.router.add_post("/v3/payments", create_payment)
+    app.router.add_get("/v3/payments/{payment_id}", get_payment)
+    app.router.add_get("/checkout/{payment_id}", checkout)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(create_app(args.fail_first, args.delay, args.fail_status), host=args.host, port=args.port)